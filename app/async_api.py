@@ -0,0 +1,270 @@
+"""
+асинхронный режим API для чтения (ASGI)
+
+отдает те же GET-маршруты /movies/ (включая /movies/export), /genres/, /directors/
+и /ready, что и Flask-приложение, с теми же ответами; запросы выполняются через асинхронный
+движок SQLAlchemy (aiosqlite, asyncpg), поэтому число одновременных запросов
+не ограничено числом потоков; запись (POST/PUT/DELETE) остается за WSGI-приложением
+
+модели, схемы, фильтры, пагинация и сериализация общие с Flask-приложением,
+оно же хранит конфиг: каждый запрос выполняется в его app_context;
+кэш ответов, объединение запросов, ограничение частоты, сжатие и /metrics
+в этом режиме не используются (сжатие, в том числе выгрузки, - на стороне прокси)
+
+нужны драйвер aiosqlite (или asyncpg) и ASGI-сервер, например uvicorn;
+запуск: uvicorn asgi:app
+"""
+import re
+from datetime import datetime
+from urllib.parse import parse_qsl
+
+from flask import jsonify
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import NotFound
+from werkzeug.routing import RequestRedirect
+from werkzeug.utils import get_content_type
+
+from app.database import create_async_db_engine
+from app.export import EXPORT_FORMATS, export_encoder, export_headers, export_statement, parse_updated_since
+from app.migrations import current_version, latest_version
+from app.serialization import dump_movie_rows, dumps, dumps_line, movie_view_statement
+from app.stats import stats_statement
+from models import Director, DirectorSchema, DirectorStatsSchema, Genre, GenreSchema, GenreStatsSchema, MovieView
+from utils import (
+    filter_movies, get_page_size, is_filtered, movie_fields, page_query, page_result, search_statement, wants_stream,
+)
+
+NOT_ALLOWED = {"message": "The method is not allowed for the requested URL."}
+
+# справочник -> (модель, схема записи, схема сводки, колонка фильма)
+DIRECTORIES = {
+    "genres": (Genre, GenreSchema(many=True), GenreStatsSchema(), MovieView.genre_id),
+    "directors": (Director, DirectorSchema(many=True), DirectorStatsSchema(), MovieView.director_id),
+}
+
+
+class AsyncResponse:
+    __slots__ = ("status", "body", "headers")
+
+    def __init__(self, status, body=b"", headers=None, mimetype="application/json"):
+        self.status = status
+        self.body = body
+        self.headers = [(b"content-type", mimetype.encode())]
+        if isinstance(body, bytes) and status != 204:
+            self.headers.append((b"content-length", str(len(body)).encode()))
+        self.headers.extend((name.lower().encode(), str(value).encode()) for name, value in (headers or {}).items())
+
+
+class AsyncApi:
+    """
+    ASGI-приложение поверх настроенного Flask-приложения (create_app)
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.engine = create_async_db_engine(flask_app)
+        directories = "|".join(DIRECTORIES)
+        self.routes = [
+            (re.compile(r"/movies/"), self.movies),
+            (re.compile(r"/movies/search"), self.search),
+            (re.compile(r"/movies/export"), self.export),
+            (re.compile(r"/movies/(?P<mid>\d+)"), self.movie),
+            (re.compile(rf"/(?P<name>{directories})/"), self.directory),
+            (re.compile(rf"/(?P<name>{directories})/stats"), self.directory_stats),
+            (re.compile(rf"/(?P<name>{directories})/(?P<item_id>\d+)/stats"), self.item_stats),
+            (re.compile(rf"/(?P<name>{directories})/(?P<item_id>\d+)"), self.item_movies),
+            (re.compile(r"/ready"), self.ready),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+
+        with self.flask_app.app_context():
+            response = await self._dispatch(scope)
+            await send({"type": "http.response.start", "status": response.status, "headers": response.headers})
+            if isinstance(response.body, bytes) or scope["method"] == "HEAD":
+                body = response.body if isinstance(response.body, bytes) else b""
+                await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
+                return
+            async for chunk in response.body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _dispatch(self, scope):
+        path = scope["path"]
+        for pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if match:
+                break
+        else:
+            # как Flask: /movies -> /movies/
+            if any(pattern.fullmatch(path + "/") for pattern, _ in self.routes):
+                return self._redirect(scope, path + "/")
+            return self._flask(NotFound().get_response(), 404)
+
+        if scope["method"] not in ("GET", "HEAD"):
+            return self._json(NOT_ALLOWED, 405)
+
+        args = MultiDict(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True))
+        return await handler(args, **match.groupdict())
+
+    @staticmethod
+    def _json(data, status=200, headers=None):
+        if status == 204:
+            return AsyncResponse(status, headers=headers)
+        return AsyncResponse(status, dumps(data), headers)
+
+    def _redirect(self, scope, path):
+        host = dict(scope.get("headers", [])).get(b"host", b"localhost").decode("latin-1")
+        url = f"{scope.get('scheme', 'http')}://{host}{path}"
+        if scope["query_string"]:
+            url += "?" + scope["query_string"].decode("latin-1")
+        response = RequestRedirect(url).get_response()
+        return self._flask(response, 308, {"Location": response.headers["Location"]})
+
+    async def _rows(self, statement):
+        async with self.engine.connect() as connection:
+            return (await connection.execute(statement)).all()
+
+    def _stream(self, statement, names):
+        chunk_size = self.flask_app.config["MOVIES_STREAM_CHUNK_SIZE"]
+
+        async def generate():
+            async with self.engine.connect() as connection:
+                result = await connection.stream(statement.order_by(MovieView.id).execution_options(yield_per=chunk_size))
+                async for rows in result.partitions(chunk_size):
+                    yield b"".join(dumps_line(item) for item in dump_movie_rows(rows, names))
+
+        return AsyncResponse(200, generate(), mimetype="application/x-ndjson")
+
+    async def _page(self, filter_statement, args, empty_status=None):
+        try:
+            names, selected = movie_fields(args)
+            statement = filter_statement(movie_view_statement(selected))
+        except ValueError as error:
+            return self._json(str(error), 400)
+
+        if wants_stream(args):
+            return self._stream(statement, names)
+
+        statement, sort, limit = page_query(statement, args, MovieView)
+        movies, next_cursor = page_result(await self._rows(statement), sort, limit)
+        if empty_status and not movies:
+            return self._json("", empty_status)
+
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        return self._json(dump_movie_rows(movies, names), 200, headers)
+
+    async def movies(self, args):
+        def filter_statement(statement):
+            return filter_movies(statement, args, MovieView)
+
+        return await self._page(filter_statement, args, 204 if is_filtered(args) else None)
+
+    async def search(self, args):
+        query_text = args.get("q", "")
+        if not query_text.strip():
+            return self._json("Нужен параметр q", 400)
+        try:
+            names, selected = movie_fields(args)
+        except ValueError as error:
+            return self._json(str(error), 400)
+
+        statement = search_statement(query_text, get_page_size(args))
+        movie_ids = [row[0] for row in await self._rows(statement)] if statement is not None else []
+        rows = await self._rows(movie_view_statement(selected).filter(MovieView.id.in_(movie_ids))) if movie_ids else []
+        movies = {row.id: row for row in rows}
+        return self._json(dump_movie_rows((movies[movie_id] for movie_id in movie_ids if movie_id in movies), names))
+
+    async def export(self, args):
+        file_format = args.get("format", "ndjson")
+        if file_format not in EXPORT_FORMATS:
+            return self._json(f"Неизвестный формат: {file_format}", 400)
+        try:
+            updated_since = parse_updated_since(args.get("updated_since"))
+        except ValueError:
+            return self._json("updated_since: ожидается дата в формате ISO 8601", 400)
+
+        chunk_size = self.flask_app.config["MOVIES_STREAM_CHUNK_SIZE"]
+        statement = export_statement(updated_since).execution_options(yield_per=chunk_size)
+        started_at = datetime.utcnow()
+
+        async def generate():
+            encode = export_encoder(file_format)
+            header = encode()
+            if header:
+                yield header
+            async with self.engine.connect() as connection:
+                result = await connection.stream(statement)
+                async for rows in result.partitions(chunk_size):
+                    yield encode(rows)
+
+        mimetype = get_content_type(EXPORT_FORMATS[file_format], "utf-8")
+        return AsyncResponse(200, generate(), export_headers(file_format, started_at), mimetype)
+
+    async def movie(self, args, mid):
+        try:
+            names, selected = movie_fields(args)
+        except ValueError as error:
+            return self._json(str(error), 400)
+
+        movies = await self._rows(movie_view_statement(selected).filter(MovieView.id == int(mid)))
+        if not movies:
+            return self._json("", 404)
+        return self._json(dump_movie_rows(movies, names)[0])
+
+    async def directory(self, args, name):
+        model, schema, _, _ = DIRECTORIES[name]
+        async with AsyncSession(self.engine) as session:
+            items = (await session.execute(select(model))).scalars().all()
+            if not items:
+                return self._json("", 404)
+            return self._json(schema.dump(items))
+
+    async def directory_stats(self, args, name):
+        model, _, stats_schema, _ = DIRECTORIES[name]
+        return self._json(stats_schema.dump(await self._rows(stats_statement(model)), many=True))
+
+    async def item_stats(self, args, name, item_id):
+        model, _, stats_schema, _ = DIRECTORIES[name]
+        stats = await self._rows(stats_statement(model).filter(model.id == int(item_id)).limit(1))
+        if not stats:
+            return self._json("", 404)
+        return self._json(stats_schema.dump(stats[0]))
+
+    async def item_movies(self, args, name, item_id):
+        _, _, _, movie_column = DIRECTORIES[name]
+        return await self._page(lambda statement: statement.filter(movie_column == int(item_id)), args)
+
+    async def ready(self, args):
+        expected = latest_version()
+        try:
+            async with self.engine.connect() as connection:
+                version = await connection.run_sync(current_version)
+        except SQLAlchemyError:
+            return self._flask(jsonify(status="unavailable", reason="database"), 503)
+
+        if version is None or version < expected:
+            response = jsonify(status="unavailable", reason="migrations", schema_version=version, expected=expected)
+            return self._flask(response, 503)
+        return self._flask(jsonify(status="ready", schema_version=version), 200)
+
+    @staticmethod
+    def _flask(response, status, headers=None):
+        # ответ, собранный средствами Flask/werkzeug (как в синхронном приложении)
+        return AsyncResponse(status, response.get_data(), headers, response.content_type)
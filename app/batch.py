@@ -0,0 +1,181 @@
+"""
+пакетная запись (создание, upsert, удаление) списка записей
+одной транзакцией с отчетом по каждой записи
+"""
+from flask import request
+from sqlalchemy import insert, select
+
+from app.database import chunks, db, upsert_statement
+
+CREATE = "create"
+UPSERT = "upsert"
+DELETE = "delete"
+
+
+def _existing(column, values):
+    """
+    возвращает словарь "значение колонки -> id" для существующих записей
+    """
+    model_id = column.table.c.id
+    found = {}
+    for chunk in chunks(set(values)):
+        found.update(db.session.execute(select(column, model_id).where(column.in_(chunk))).all())
+    return found
+
+
+def _item_id(item, mode):
+    return item if mode == DELETE else item.get("id")
+
+
+def _validate(item, mode):
+    if mode == DELETE:
+        return None if isinstance(item, int) else "ожидается id записи"
+    if not isinstance(item, dict):
+        return "ожидается объект"
+    if item.get("id") is not None and not isinstance(item["id"], int):
+        return "id должен быть целым числом"
+    if mode == UPSERT and item.get("id") is None:
+        return "для upsert нужен id"
+    return None
+
+
+def _unique_errors(table, items, indexes):
+    """
+    проверяет уникальные колонки (кроме pk): повторы в пакете и в таблице
+    """
+    errors = {}
+    for column in table.columns:
+        if not column.unique or column.primary_key:
+            continue
+
+        values = {index: items[index].get(column.name) for index in indexes}
+        existing = _existing(column, [value for value in values.values() if value is not None])
+        seen = set()
+        for index, value in values.items():
+            if value is None:
+                continue
+            if value in seen:
+                errors[index] = f"повторяющееся значение {column.name} в пакете"
+            elif value in existing and existing[value] != items[index].get("id"):
+                errors[index] = f"запись с таким {column.name} уже есть"
+            seen.add(value)
+    return errors
+
+
+def batch_write(model, items, mode, to_rows=None, before_write=None, after_write=None, validate=None):
+    """
+    выполняет пакетную операцию над таблицей модели в текущей транзакции
+
+    items - список объектов (для delete - список id),
+    to_rows - преобразование принятых объектов в строки таблицы
+    (по умолчанию берутся одноименные колонки),
+    before_write, after_write - вызываются со списком id записей
+    до и после изменения таблицы,
+    validate - дополнительная проверка: по списку id принятых записей
+    возвращает словарь "id -> ошибка" для записей, которые нельзя изменить
+
+    возвращает список результатов в порядке items
+    """
+    table = model.__table__
+    results = [{"index": index} for index in range(len(items))]
+
+    accepted = []
+    for index, item in enumerate(items):
+        error = _validate(item, mode)
+        if error:
+            results[index].update(status="error", error=error)
+        else:
+            accepted.append(index)
+
+    ids = [_item_id(items[index], mode) for index in accepted]
+    existing_ids = set(_existing(table.c.id, [item_id for item_id in ids if item_id is not None]))
+
+    seen = set()
+    checked = []
+    for index in accepted:
+        item_id = _item_id(items[index], mode)
+        results[index]["id"] = item_id
+        if item_id is not None and item_id in seen:
+            results[index].update(status="error", error="повторяющийся id в пакете")
+        elif mode == CREATE and item_id in existing_ids:
+            results[index].update(status="error", error="запись с таким id уже есть")
+        elif mode == DELETE and item_id not in existing_ids:
+            results[index].update(status="error", error="такой записи в базе нет")
+        else:
+            checked.append(index)
+        seen.add(item_id)
+    accepted = checked
+
+    if mode != DELETE:
+        unique_errors = _unique_errors(table, items, accepted)
+        for index, error in unique_errors.items():
+            results[index].update(status="error", error=error)
+        accepted = [index for index in accepted if index not in unique_errors]
+
+    if validate is not None:
+        validate_errors = validate([_item_id(items[index], mode) for index in accepted])
+        for index in accepted:
+            error = validate_errors.get(_item_id(items[index], mode))
+            if error:
+                results[index].update(status="error", error=error)
+        accepted = [index for index in accepted if results[index].get("status") != "error"]
+
+    if before_write is not None:
+        before_write([_item_id(items[index], mode) for index in accepted])
+
+    if mode == DELETE:
+        for chunk in chunks(items[index] for index in accepted):
+            db.session.execute(table.delete().where(table.c.id.in_(chunk)))
+        for index in accepted:
+            results[index]["status"] = "deleted"
+        if after_write is not None:
+            after_write([])
+        return results
+
+    if to_rows is None:
+        columns = [column.name for column in table.columns if column.onupdate is None]
+        rows = [{name: items[index].get(name) for name in columns} for index in accepted]
+    else:
+        rows = to_rows([items[index] for index in accepted])
+
+    with_id = [row for row in rows if row.get("id") is not None]
+    without_id = [{key: value for key, value in row.items() if key != "id"} for row in rows if row.get("id") is None]
+
+    if with_id:
+        stmt = upsert_statement(table) if mode == UPSERT else insert(table)
+        db.session.execute(stmt, with_id)
+    if without_id:
+        db.session.bulk_insert_mappings(model, without_id, return_defaults=True)
+
+    new_ids = iter(row["id"] for row in without_id)
+    for index, row in zip(accepted, rows):
+        if row.get("id") is None:
+            results[index]["id"] = next(new_ids)
+        updated = mode == UPSERT and row.get("id") in existing_ids
+        results[index]["status"] = "updated" if updated else "created"
+
+    if after_write is not None:
+        after_write([results[index]["id"] for index in accepted])
+    return results
+
+
+def batch_response(results):
+    """
+    формирует ответ: 200, если все записи обработаны, иначе 207
+    """
+    errors = sum(1 for result in results if result.get("status") == "error")
+    return {"results": results, "errors": errors}, 207 if errors else 200
+
+
+def run_batch(model, mode, to_rows=None, before_write=None, after_write=None, validate=None):
+    """
+    выполняет пакетную операцию над телом запроса (список записей)
+    одной транзакцией и формирует ответ
+    """
+    items = request.json
+    if not isinstance(items, list):
+        return "Ожидается список записей", 400
+
+    with db.session.begin():
+        results = batch_write(model, items, mode, to_rows, before_write, after_write, validate)
+    return batch_response(results)
@@ -0,0 +1,144 @@
+"""
+кэш ответов GET-запросов (LRU + TTL) с поддержкой ETag/Last-Modified
+
+кэш подключается к namespace через decorators=[response_cache.cached]:
+GET-ответы 200 сохраняются по пути и параметрам запроса (HEAD отдается
+из той же записи), успешный запрос на запись (WRITE_METHODS) очищает кэш
+и начинает новое поколение: ответ GET-запроса, во время которого была запись,
+не сохраняется; остальные методы (OPTIONS) и чтение своих записей
+с основной БД (app/replicas.py) проходят мимо кэша
+
+у каждого приложения свой кэш (app.extensions["response_cache"])
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request
+
+from app.replicas import reads_own_writes
+
+WRITE_METHODS = frozenset(("POST", "PUT", "PATCH", "DELETE"))
+READ_METHODS = frozenset(("GET", "HEAD"))
+
+
+class CachedResponse:
+    __slots__ = ("body", "status", "headers", "mimetype", "etag", "last_modified", "expires_at", "encoded")
+
+    def __init__(self, response, ttl):
+        self.body = response.get_data()
+        self.status = response.status_code
+        self.headers = [(key, value) for key, value in response.headers if key.lower() != "content-length"]
+        self.mimetype = response.mimetype
+        self.etag = hashlib.sha1(self.body).hexdigest()
+        self.last_modified = int(time.time())
+        self.expires_at = time.monotonic() + ttl
+        # сжатые тела по Content-Encoding (заполняет app/compression.py)
+        self.encoded = {}
+
+    def to_response(self):
+        response = current_app.response_class(self.body, self.status, self.headers, mimetype=self.mimetype)
+        response.set_etag(self.etag)
+        response.last_modified = self.last_modified
+        response.encoded_bodies = self.encoded
+        return response
+
+
+class CacheState:
+    """
+    ответы в кэше одного приложения (app.extensions["response_cache"])
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, response, generation=None):
+        """
+        сохраняет ответ; generation - поколение на начало запроса,
+        если с тех пор была запись, ответ не сохраняется (None - сохранить всегда)
+        """
+        entry = CachedResponse(response, self.ttl)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+class ResponseCache:
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+
+    def init_app(self, app):
+        app.extensions["response_cache"] = CacheState(
+            app.config.get("RESPONSE_CACHE_SIZE", self.max_size),
+            app.config.get("RESPONSE_CACHE_TTL", self.ttl),
+        )
+
+    @staticmethod
+    def state():
+        """
+        кэш текущего приложения
+        """
+        return current_app.extensions["response_cache"]
+
+    def clear(self):
+        self.state().clear()
+
+    def cached(self, view):
+        """
+        декоратор view-функции namespace
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = self.state()
+            if request.method in WRITE_METHODS:
+                response = view(*args, **kwargs)
+                if response.status_code < 400:
+                    cache.clear()
+                return response
+
+            if request.method not in READ_METHODS or not cache.max_size or reads_own_writes():
+                return view(*args, **kwargs)
+
+            key = (request.path, tuple(sorted(request.args.items(multi=True))))
+            entry = cache.get(key)
+            if entry is None:
+                generation = cache.generation
+                response = view(*args, **kwargs)
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                entry = cache.set(key, response, generation)
+
+            return entry.to_response().make_conditional(request)
+
+        return wrapper
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,147 @@
+"""
+объединение одинаковых одновременных GET-запросов (single-flight)
+
+подключается к namespace через decorators=[request_coalescer.coalesced("<namespace>")],
+работает для namespace из настройки COALESCE_NAMESPACES: пока первый запрос
+(ведущий) выполняет view, остальные запросы с тем же путем и параметрами
+ждут его и получают копию ответа, не выполняя запросы к БД повторно
+
+потоковые ответы не разделяются - ожидавшие запросы выполняют view сами,
+чтение своих записей с основной БД (app/replicas.py) не объединяется,
+HEAD объединяется с GET; успешный запрос на запись (WRITE_METHODS, как у кэша
+ответов) начинает новое поколение: запросы после записи не присоединяются
+к вычислению, начатому до нее
+
+у каждого приложения свои выполняемые запросы (app.extensions["request_coalescer"])
+"""
+import threading
+from functools import wraps
+
+from flask import current_app, request
+
+from app.cache import READ_METHODS, WRITE_METHODS
+from app.replicas import reads_own_writes
+
+
+class SharedResponse:
+    __slots__ = ("body", "status", "headers", "mimetype")
+
+    def __init__(self, response):
+        self.body = response.get_data()
+        self.status = response.status_code
+        self.headers = [(key, value) for key, value in response.headers if key.lower() != "content-length"]
+        self.mimetype = response.mimetype
+
+    def to_response(self):
+        return current_app.response_class(self.body, self.status, self.headers, mimetype=self.mimetype)
+
+
+class Flight:
+    __slots__ = ("done", "response", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class CoalescerState:
+    """
+    выполняемые запросы одного приложения (app.extensions["request_coalescer"])
+    """
+
+    def __init__(self, namespaces, timeout):
+        self.namespaces = set(namespaces)
+        self.timeout = timeout
+        self.generation = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        """
+        (вычисление, True - текущий запрос ведущий)
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = Flight()
+            return flight, True
+
+    def lead(self, flight, key, view, args, kwargs):
+        try:
+            response = view(*args, **kwargs)
+            if not response.is_streamed:
+                flight.response = SharedResponse(response)
+            return response
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def written(self):
+        """
+        начинает новое поколение после записи
+        """
+        with self._lock:
+            self.generation += 1
+
+
+class RequestCoalescer:
+    def __init__(self, timeout=30):
+        self.namespaces = set()
+        self.timeout = timeout
+
+    def init_app(self, app):
+        app.extensions["request_coalescer"] = CoalescerState(
+            app.config.get("COALESCE_NAMESPACES", self.namespaces),
+            app.config.get("COALESCE_TIMEOUT", self.timeout),
+        )
+
+    @staticmethod
+    def state():
+        """
+        выполняемые запросы текущего приложения
+        """
+        return current_app.extensions["request_coalescer"]
+
+    def coalesced(self, namespace):
+        """
+        декоратор view-функций namespace
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                state = self.state()
+                if request.method in WRITE_METHODS:
+                    response = view(*args, **kwargs)
+                    if response.status_code < 400:
+                        state.written()
+                    return response
+
+                if request.method not in READ_METHODS or namespace not in state.namespaces or reads_own_writes():
+                    return view(*args, **kwargs)
+
+                key = (state.generation, request.path, tuple(sorted(request.args.items(multi=True))))
+                flight, leader = state.join(key)
+                if leader:
+                    return state.lead(flight, key, view, args, kwargs)
+
+                if flight.done.wait(state.timeout):
+                    if flight.error is not None:
+                        raise flight.error
+                    if flight.response is not None:
+                        return flight.response.to_response()
+                # ведущий не успел или ответ потоковый
+                return view(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+
+request_coalescer = RequestCoalescer()
@@ -0,0 +1,88 @@
+"""
+сжатие ответов по Accept-Encoding (включается настройкой COMPRESSION)
+
+сжимаются готовые (не потоковые) успешные ответы с типом из COMPRESSIBLE_TYPES
+размером от COMPRESSION_MIN_SIZE байт: br (если установлен пакет brotli)
+или gzip - что клиент предпочитает по q-весам; такие ответы получают
+Vary: Accept-Encoding, а ETag сжатого ответа становится слабым, поэтому
+условные запросы к кэшу ответов продолжают работать
+
+потоковые ответы и ответы с Content-Encoding (gzip в /movies/export) не трогаются;
+сжатое тело ответа из кэша ответов сохраняется в его записи (CachedResponse.encoded)
+"""
+import gzip
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html")
+
+
+class CompressionSettings:
+    """
+    настройки сжатия одного приложения (app.extensions["compression"])
+    """
+
+    def __init__(self, config):
+        self.min_size = config["COMPRESSION_MIN_SIZE"]
+        self.gzip_level = config["COMPRESSION_GZIP_LEVEL"]
+        self.brotli_quality = config["COMPRESSION_BROTLI_QUALITY"]
+
+    def compress(self, body, encoding):
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, self.gzip_level, mtime=0)
+
+
+class Compression:
+    def init_app(self, app):
+        if not app.config["COMPRESSION"]:
+            return
+
+        app.extensions["compression"] = CompressionSettings(app.config)
+        app.after_request(self._after_request)
+
+    @property
+    def encodings(self):
+        return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+    def _after_request(self, response):
+        if (
+            not 200 <= response.status_code < 300
+            or response.is_streamed
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES
+        ):
+            return response
+
+        settings = current_app.extensions["compression"]
+        body = response.get_data()
+        if len(body) < settings.min_size:
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            return response
+
+        # ответ из кэша ответов сжимается один раз на кодировку
+        encoded = getattr(response, "encoded_bodies", None)
+        data = encoded.get(encoding) if encoded is not None else None
+        if data is None:
+            data = settings.compress(body, encoding)
+            if encoded is not None:
+                encoded[encoding] = data
+        response.set_data(data)
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+compression = Compression()
@@ -1,4 +1,108 @@
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_rate_limits(name):
+    """
+    лимиты вида "movies=100/1,genres=20/1" -> {namespace: (запросов, за секунд)}
+    """
+    limits = {}
+    for item in os.environ.get(name, "").split(","):
+        if item:
+            namespace, _, limit = item.partition("=")
+            requests, _, seconds = limit.partition("/")
+            limits[namespace.strip()] = (int(requests), float(seconds or 1))
+    return limits
+
+
 class Config:
+    DEBUG = False
+    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", 'sqlite:///test.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # пул соединений
+    DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 5)
+    DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 10)
+    DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)  # секунд
+    DB_STATEMENT_TIMEOUT_MS = _env_int("DB_STATEMENT_TIMEOUT_MS", 5000)  # только PostgreSQL
+
+    # реплики для чтения (через запятую); GET-запросы идут на них по кругу
+    DATABASE_REPLICA_URLS = [url for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url]
+    REPLICA_HEALTH_CHECK_INTERVAL = _env_int("REPLICA_HEALTH_CHECK_INTERVAL", 10)  # секунд
+    READ_YOUR_WRITES_SECONDS = _env_int("READ_YOUR_WRITES_SECONDS", 5)  # чтение с основной БД после записи
+    READ_YOUR_WRITES_COOKIE = "db_primary_until"
+    SQLITE_REPLICA_SYNC = os.environ.get("SQLITE_REPLICA_SYNC", "1") == "1"  # копировать файл SQLite на реплики
+
+    # настройки SQLite, применяются к каждому новому соединению
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_MMAP_SIZE = _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+    SQLITE_BUSY_TIMEOUT_MS = _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+    SQLITE_FOREIGN_KEYS = os.environ.get("SQLITE_FOREIGN_KEYS", "1") == "1"  # проверка внешних ключей
+
+    # фильмы удаляемого жанра или режиссера: restrict (запрет), set_null (сброс ссылки), cascade (удаление)
+    DIRECTORY_DELETE_MODE = os.environ.get("DIRECTORY_DELETE_MODE", "set_null")
+
+    MOVIES_PER_PAGE = 5  # размер страницы по умолчанию
+    MOVIES_MAX_PAGE_SIZE = 100  # максимальное значение параметра limit
+    MOVIES_STREAM_CHUNK_SIZE = 500  # размер пачки при потоковой выдаче (stream=ndjson)
+    RESPONSE_CACHE_SIZE = 1024  # число ответов в кэше (0 - кэш выключен)
+    RESPONSE_CACHE_TTL = 60  # время жизни ответа в кэше, секунд
+    FAST_SERIALIZATION = True  # списки фильмов выбираются кортежами колонок, без MovieSchema.dump
+    JSON_ENCODER = os.environ.get("JSON_ENCODER", "json")  # json (как flask-restx) или orjson
+
+    # сжатие ответов gzip/br по Accept-Encoding
+    COMPRESSION = os.environ.get("COMPRESSION", "1") == "1"
+    COMPRESSION_MIN_SIZE = _env_int("COMPRESSION_MIN_SIZE", 1024)  # байт, меньшие ответы не сжимаются
+    COMPRESSION_GZIP_LEVEL = _env_int("COMPRESSION_GZIP_LEVEL", 6)
+    COMPRESSION_BROTLI_QUALITY = _env_int("COMPRESSION_BROTLI_QUALITY", 5)
+
+    # объединение одинаковых одновременных GET-запросов (namespace через запятую)
+    COALESCE_NAMESPACES = [name for name in os.environ.get("COALESCE_NAMESPACES", "movies,genres,directors").split(",") if name]
+    COALESCE_TIMEOUT = _env_int("COALESCE_TIMEOUT", 30)  # сколько ждать ведущий запрос, секунд
+
+    # token bucket на клиента и маршрут: namespace -> (запросов, за секунд), по умолчанию без ограничений
+    RATE_LIMITS = _env_rate_limits("RATE_LIMITS")
+    RATE_LIMIT_MAX_KEYS = _env_int("RATE_LIMIT_MAX_KEYS", 10000)  # число ведер в памяти
+
+    # снимок справочников в памяти процесса для /genres/ и /directors/
+    CATALOGUE_SNAPSHOT = os.environ.get("CATALOGUE_SNAPSHOT", "1") == "1"
+    SNAPSHOT_CHECK_INTERVAL_MS = _env_int("SNAPSHOT_CHECK_INTERVAL_MS", 1000)  # сверка версии в БД
+
+    # Server-Timing, /metrics и лог медленных SQL-запросов
+    INSTRUMENTATION = os.environ.get("INSTRUMENTATION", "0") == "1"
+    SLOW_QUERY_MS = _env_int("SLOW_QUERY_MS", 100)
+
+
+class DevelopmentConfig(Config):
     DEBUG = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///test.db'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+
+
+class ProductionConfig(Config):
+    DEBUG = False
+
+
+class TestingConfig(Config):
+    TESTING = True
+    # для тестов на PostgreSQL - адрес локального сервера без контейнера (см. tests/conftest.py)
+    SQLALCHEMY_DATABASE_URI = os.environ.get("TEST_DATABASE_URL", 'sqlite:///test.db')
+    RESPONSE_CACHE_SIZE = 0
+    CATALOGUE_SNAPSHOT = False
+
+
+CONFIGS = {
+    "development": DevelopmentConfig,
+    "production": ProductionConfig,
+    "testing": TestingConfig,
+}
+
+
+def get_config(name=None):
+    """
+    возвращает конфиг по имени профиля (по умолчанию из переменной APP_ENV,
+    без нее - production, чтобы сервер не запускался с DEBUG по ошибке)
+    """
+    return CONFIGS[name or os.environ.get("APP_ENV", "production")]()
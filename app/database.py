@@ -1,3 +1,179 @@
-from flask_sqlalchemy import SQLAlchemy
+import logging
 
-db = SQLAlchemy()
+from flask import g, has_request_context
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, insert, or_, orm
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+logger = logging.getLogger("app.database")
+
+
+class RoutingSession(SignallingSession):
+    """
+    сессия, которая в запросах на чтение выполняет SQL на реплике,
+    выбранной для запроса (g._read_engine, см. app/replicas.py), а остальное - на основной БД
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        read_engine = g.get("_read_engine") if has_request_context() else None
+        if read_engine is not None:
+            return read_engine
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+db = RoutingSQLAlchemy()
+
+# максимальное число значений в одном условии IN (...)
+IN_CHUNK_SIZE = 500
+
+
+def chunks(values, size=IN_CHUNK_SIZE):
+    """
+    разбивает значения на списки не длиннее size для условий IN (...), None пропускаются
+    """
+    values = [value for value in values if value is not None]
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+# асинхронные драйверы для create_async_engine
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def replica_binds(config):
+    """
+    ключи SQLALCHEMY_BINDS для реплик из DATABASE_REPLICA_URLS
+    """
+    return [f"replica_{number}" for number in range(len(config["DATABASE_REPLICA_URLS"]))]
+
+
+def engine_options(config):
+    """
+    параметры create_engine для СУБД из SQLALCHEMY_DATABASE_URI
+    """
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    pool_options = {
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": True,
+    }
+
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            return {}
+        # соединения с файлом БД переиспользуются, PRAGMA выполняются один раз на соединение
+        return dict(
+            pool_options,
+            poolclass=QueuePool,
+            connect_args={"check_same_thread": False, "timeout": config["SQLITE_BUSY_TIMEOUT_MS"] / 1000},
+        )
+
+    if url.get_backend_name() == "postgresql":
+        return dict(
+            pool_options,
+            connect_args={"options": f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"},
+        )
+
+    return pool_options
+
+
+def _set_sqlite_pragmas(config, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}")
+    cursor.execute(f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}")
+    cursor.execute(f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}")
+    cursor.execute(f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+    cursor.execute(f"PRAGMA foreign_keys={'ON' if config['SQLITE_FOREIGN_KEYS'] else 'OFF'}")
+    cursor.close()
+
+
+def init_db(app):
+    """
+    подключает БД (и реплики для чтения) к приложению с настройками пула и PRAGMA для SQLite
+    """
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config))
+    app.config.setdefault(
+        "SQLALCHEMY_BINDS", dict(zip(replica_binds(app.config), app.config["DATABASE_REPLICA_URLS"]))
+    )
+    db.init_app(app)
+
+    for bind in [None] + replica_binds(app.config):
+        engine = db.get_engine(app, bind=bind)
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "connect", lambda *args: _set_sqlite_pragmas(app.config, *args))
+
+
+def async_engine_options(config):
+    """
+    параметры create_async_engine: те же, что у engine_options, с асинхронным пулом
+    """
+    options = engine_options(config)
+    if options.get("poolclass") is QueuePool:
+        options["poolclass"] = AsyncAdaptedQueuePool
+    if "options" in options.get("connect_args", {}):
+        # asyncpg передает параметры сервера отдельно
+        options["connect_args"] = {"server_settings": {"statement_timeout": str(config["DB_STATEMENT_TIMEOUT_MS"])}}
+    return options
+
+
+def create_async_db_engine(app):
+    """
+    асинхронный движок (aiosqlite, asyncpg) для той же БД, что и db.engine приложения,
+    с теми же настройками пула и PRAGMA
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = db.get_engine(app).url
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        # драйвер из URL должен быть асинхронным, настройки пула не подбираются
+        logger.warning("асинхронный драйвер для %s неизвестен, используется %s без настроек", backend, url.drivername)
+        return create_async_engine(url)
+
+    engine = create_async_engine(url.set(drivername=ASYNC_DRIVERS[backend]), **async_engine_options(app.config))
+    if backend == "sqlite":
+        event.listen(engine.sync_engine, "connect", lambda *args: _set_sqlite_pragmas(app.config, *args))
+    return engine
+
+
+def dialect_insert(table):
+    """
+    возвращает insert() текущей СУБД с поддержкой ON CONFLICT (upsert),
+    для других СУБД - обычный insert()
+    """
+    dialect_name = db.engine.dialect.name
+    if dialect_name == "postgresql":
+        return postgresql.insert(table)
+    if dialect_name == "sqlite":
+        return sqlite.insert(table)
+    logger.warning("ON CONFLICT не поддерживается для %s, используется обычный INSERT", dialect_name)
+    return insert(table)
+
+
+def upsert_statement(table):
+    """
+    INSERT ... ON CONFLICT (pk) DO UPDATE, который не перезаписывает
+    строки, если ни одна колонка не изменилась (без ON CONFLICT - обычный INSERT)
+    """
+    stmt = dialect_insert(table)
+    if not hasattr(stmt, "on_conflict_do_update"):
+        return stmt
+    columns = [column for column in table.columns if not column.primary_key]
+    # колонки с onupdate (время изменения) не сравниваются, а обновляются вместе с остальными
+    compared = [column.name for column in columns if column.onupdate is None]
+    return stmt.on_conflict_do_update(
+        index_elements=[column.name for column in table.primary_key],
+        set_={column.name: stmt.excluded[column.name] for column in columns},
+        where=or_(*[table.c[name].is_distinct_from(stmt.excluded[name]) for name in compared]),
+    )
@@ -0,0 +1,150 @@
+"""
+выгрузка всего каталога фильмов (/movies/export)
+
+фильмы читаются курсором на стороне сервера пачками (yield_per) по возрастанию id
+и сразу отдаются клиенту, поэтому память не зависит от размера таблицы
+
+форматы:
+    ndjson - по фильму в строке (поля MovieSchema и updated_at)
+    csv    - с заголовком, пустое значение - пустая ячейка
+
+updated_since - только фильмы, измененные начиная с этого момента (ISO 8601, UTC);
+время начала выгрузки возвращается в заголовке X-Export-Started-At,
+его можно передать как updated_since в следующий раз;
+при Accept-Encoding: gzip ответ сжимается на лету
+"""
+import csv
+import io
+import zlib
+from datetime import datetime, timezone
+
+from flask import Response, current_app, stream_with_context
+
+from app.database import db
+from app.serialization import MOVIE_FIELDS, dumps_line, movie_rows_query
+from models import Movie
+
+EXPORT_FIELDS = MOVIE_FIELDS + ["updated_at"]
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def parse_updated_since(value):
+    """
+    момент времени из параметра updated_since (наивное время UTC), None - без фильтра;
+    ValueError - если значение не в формате ISO 8601
+    """
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def export_query(updated_since=None):
+    """
+    запрос фильмов для выгрузки: кортежи колонок в порядке EXPORT_FIELDS
+    """
+    query = movie_rows_query().add_columns(Movie.updated_at)
+    if updated_since is not None:
+        query = query.filter(Movie.updated_at >= updated_since)
+    return query.order_by(Movie.id)
+
+
+def export_statement(updated_since=None):
+    """
+    то же, что export_query(), в виде select() (для асинхронного движка)
+    """
+    return export_query(updated_since).statement
+
+
+def _records(rows):
+    for row in rows:
+        record = dict(zip(EXPORT_FIELDS, row))
+        if record["updated_at"] is not None:
+            record["updated_at"] = record["updated_at"].isoformat()
+        yield record
+
+
+def _encode_ndjson(rows):
+    return b"".join(dumps_line(record) for record in _records(rows))
+
+
+def _csv_encoder():
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, EXPORT_FIELDS, lineterminator="\n")
+
+    def encode(rows=None):
+        if rows is None:
+            writer.writeheader()
+        else:
+            writer.writerows(_records(rows))
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    return encode
+
+
+def export_encoder(file_format):
+    """
+    кодировщик выгрузки в байты: encode() - начало файла (заголовок CSV),
+    encode(rows) - пачка строк
+    """
+    if file_format == "csv":
+        return _csv_encoder()
+    return lambda rows=None: b"" if rows is None else _encode_ndjson(rows)
+
+
+def export_headers(file_format, started_at):
+    return {
+        "X-Export-Started-At": started_at.isoformat(),
+        "Content-Disposition": f"attachment; filename=movies.{file_format}",
+        "Vary": "Accept-Encoding",
+    }
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_movies(file_format="ndjson", updated_since=None, compress=False):
+    """
+    потоковый ответ с фильмами в формате file_format
+    """
+    chunk_size = current_app.config["MOVIES_STREAM_CHUNK_SIZE"]
+    started_at = datetime.utcnow()
+
+    def generate():
+        encode = export_encoder(file_format)
+        header = encode()
+        if header:
+            yield header
+
+        # ответ отдается уже после выхода из view, поэтому транзакция своя
+        with db.session.begin():
+            query = export_query(updated_since).execution_options(stream_results=True)
+            chunk = []
+            for row in query.yield_per(chunk_size):
+                chunk.append(row)
+                if len(chunk) == chunk_size:
+                    yield encode(chunk)
+                    chunk = []
+            if chunk:
+                yield encode(chunk)
+
+    body = generate()
+    headers = export_headers(file_format, started_at)
+    if compress:
+        body = _gzip(body)
+        headers["Content-Encoding"] = "gzip"
+    return Response(stream_with_context(body), headers=headers, mimetype=EXPORT_FORMATS[file_format])
@@ -0,0 +1,177 @@
+"""
+загрузка данных в БД пачками (bulk insert)
+
+поддерживаются форматы:
+    json   - словарь в формате app/data.py: {"genres": [...], "directors": [...], "movies": [...]}
+    ndjson - по одной записи в строке, таблица задается параметром table
+    csv    - записи с заголовком, таблица задается параметром table
+
+записи вставляются через INSERT ... ON CONFLICT (id) DO UPDATE,
+при этом неизменившиеся строки не перезаписываются, поэтому повторная
+загрузка тех же данных ничего не меняет; сводки и movie_view пересчитываются
+только для пачек, в которых что-то изменилось (при изменении большей части
+фильмов, например при первой загрузке, - целиком)
+"""
+import csv
+import json
+import time
+from itertools import islice
+
+from sqlalchemy import func, select
+
+from app.database import db, upsert_statement
+from app.read_model import refresh_movie_view, refresh_names, touch_movies
+from app.snapshot import bump_catalogue_version
+from app.stats import AffectedGroups, refresh_stats
+from models import Genre, Director, Movie
+
+BATCH_SIZE = 5000
+
+# доля изменившихся фильмов, начиная с которой сводки и movie_view пересобираются целиком
+FULL_REFRESH_SHARE = 0.5
+
+# порядок важен: фильмы ссылаются на жанры и режиссеров
+TABLES = {
+    "genres": Genre,
+    "directors": Director,
+    "movies": Movie,
+}
+
+
+def _normalize(table, record, convert_types=False):
+    """
+    приводит запись к колонкам таблицы (pk -> id, лишние поля отбрасываются)
+    """
+    if "pk" in record and "id" not in record:
+        record = dict(record, id=record["pk"])
+
+    row = {}
+    for column in table.columns:
+        if column.onupdate is not None:
+            continue  # время изменения ставится при записи
+        value = record.get(column.name)
+        if convert_types and value is not None:
+            value = column.type.python_type(value) if value != "" else None
+        row[column.name] = value
+    return row
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _load_table(connection, model, records, batch_size, convert_types=False, groups=None):
+    """
+    загружает записи в таблицу пачками, возвращает (обработано, изменено,
+    id записей из пачек, в которых что-то изменилось); для фильмов в groups
+    собираются изменившиеся фильмы и их прежние жанры и режиссеры
+    """
+    table = model.__table__
+    stmt = upsert_statement(table)
+
+    processed = changed = 0
+    changed_ids = []
+    rows = (_normalize(table, record, convert_types) for record in records)
+    for batch in _batches(rows, batch_size):
+        ids = [row["id"] for row in batch]
+        batch_groups = None
+        if groups is not None:
+            batch_groups = AffectedGroups(connection)
+            batch_groups.collect(ids)
+
+        result = connection.execute(stmt, batch)
+        processed += len(batch)
+        # -1 - драйвер не сообщил число строк, пачка считается изменившейся
+        if result.rowcount:
+            changed += max(result.rowcount, 0)
+            changed_ids.extend(ids)
+            if batch_groups is not None:
+                groups.update(batch_groups)
+    return processed, changed, changed_ids
+
+
+def import_data(data, batch_size=BATCH_SIZE):
+    """
+    загружает словарь в формате app/data.py одной транзакцией,
+    возвращает отчет о загрузке
+    """
+    return _import({name: data.get(name, []) for name in TABLES}, batch_size)
+
+
+def import_file(path, file_format=None, table=None, batch_size=BATCH_SIZE):
+    """
+    загружает файл json, ndjson или csv одной транзакцией,
+    возвращает отчет о загрузке
+    """
+    file_format = file_format or path.rsplit(".", 1)[-1].lower()
+
+    with open(path, encoding="utf-8", newline="") as file:
+        if file_format == "json":
+            return import_data(json.load(file), batch_size)
+
+        if table not in TABLES:
+            raise ValueError(f"для формата {file_format} нужно указать таблицу: {', '.join(TABLES)}")
+
+        if file_format == "ndjson":
+            records = (json.loads(line) for line in file if line.strip())
+            return _import({table: records}, batch_size)
+        if file_format == "csv":
+            return _import({table: csv.DictReader(file)}, batch_size, convert_types=True)
+
+    raise ValueError(f"неизвестный формат: {file_format}")
+
+
+def _import(records_by_table, batch_size, convert_types=False):
+    report = {"tables": {}}
+    started = time.perf_counter()
+
+    with db.engine.begin() as connection:
+        groups = AffectedGroups(connection)
+        changed_ids = {}
+        for name, model in TABLES.items():
+            if name not in records_by_table:
+                continue
+            processed, changed, changed_ids[model] = _load_table(
+                connection, model, records_by_table[name], batch_size, convert_types,
+                groups if model is Movie else None,
+            )
+            report["tables"][name] = {"processed": processed, "changed": changed}
+
+        _refresh(connection, groups, changed_ids)
+
+    elapsed = time.perf_counter() - started
+    total = sum(table["processed"] for table in report["tables"].values())
+    report["rows"] = total
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(total / elapsed) if elapsed else total
+    return report
+
+
+def _refresh(connection, groups, changed_ids):
+    """
+    пересчитывает сводки и movie_view после загрузки (в той же транзакции)
+    """
+    full = False
+    if groups.movie_ids:
+        total = connection.execute(select(func.count()).select_from(Movie)).scalar()
+        full = len(groups.movie_ids) >= total * FULL_REFRESH_SHARE
+        if full:
+            refresh_stats(executor=connection)
+            refresh_movie_view(executor=connection)
+        else:
+            # новые жанры и режиссеры изменившихся фильмов
+            groups.refresh(list(groups.movie_ids))
+
+    for model in (Genre, Director):
+        if changed_ids.get(model):
+            if not full:
+                refresh_names(model, changed_ids[model], executor=connection)
+            # время изменения фильмов - для выгрузки изменений с новым названием
+            touch_movies(model, changed_ids[model], executor=connection)
+    if changed_ids.get(Genre) or changed_ids.get(Director):
+        bump_catalogue_version(executor=connection)
@@ -0,0 +1,160 @@
+"""
+инструментирование запросов (включается настройкой INSTRUMENTATION)
+
+для каждого запроса считаются число SQL-запросов, время в БД,
+время сериализации и размер ответа; значения отдаются в заголовке
+Server-Timing и накапливаются по маршрутам для /metrics (формат Prometheus),
+SQL-запросы дольше SLOW_QUERY_MS пишутся в лог app.sql;
+у каждого приложения свои метрики (app.extensions["instrumentation"])
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+slow_query_logger = logging.getLogger("app.sql")
+
+
+@contextmanager
+def track(name):
+    """
+    добавляет время выполнения блока к счетчику name текущего запроса
+    (вложенные блоки с тем же именем не учитываются повторно)
+    """
+    timings = g.get("_timings") if has_request_context() else None
+    if timings is None or name in timings["active"]:
+        yield
+        return
+
+    timings["active"].add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] += time.perf_counter() - started
+        timings["active"].discard(name)
+
+
+class InstrumentationState:
+    """
+    метрики одного приложения по маршрутам (app.extensions["instrumentation"])
+    """
+
+    def __init__(self, slow_query_ms):
+        self.slow_query_ms = slow_query_ms
+        self.routes = defaultdict(lambda: defaultdict(float))
+        self.lock = threading.Lock()
+
+
+class Instrumentation:
+    def __init__(self):
+        self._listening = False
+
+    def init_app(self, app):
+        if not app.config["INSTRUMENTATION"]:
+            return
+
+        app.extensions["instrumentation"] = InstrumentationState(app.config["SLOW_QUERY_MS"])
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule("/metrics", "metrics", self.metrics)
+
+        if not self._listening:
+            event.listen(Engine, "before_cursor_execute", self._before_execute)
+            event.listen(Engine, "after_cursor_execute", self._after_execute)
+            self._listening = True
+
+    def init_api(self, api):
+        """
+        учитывает кодирование JSON в flask-restx как время сериализации
+        """
+        if "instrumentation" not in api.app.extensions:
+            return
+
+        output_json = api.representations["application/json"]
+
+        def timed_output_json(data, code, headers=None):
+            with track("serialize"):
+                return output_json(data, code, headers)
+
+        api.representations["application/json"] = timed_output_json
+
+    def _before_request(self):
+        g._timings = defaultdict(float, active=set())
+        g._started = time.perf_counter()
+
+    def _before_execute(self, connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def _after_execute(self, connection, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - connection.info["query_started"].pop()
+        state = current_app.extensions.get("instrumentation") if has_app_context() else None
+        if state is None:
+            return
+
+        if has_request_context() and "_timings" in g:
+            g._timings["db"] += elapsed
+            g._timings["queries"] += 1
+
+        if state.slow_query_ms is not None and elapsed * 1000 >= state.slow_query_ms:
+            route = request.path if has_request_context() else "-"
+            # только текст запроса: параметры могут содержать данные пользователей
+            slow_query_logger.warning("медленный запрос %.1f мс (%s): %s", elapsed * 1000, route, statement)
+
+    def _after_request(self, response):
+        timings = g.pop("_timings", None)
+        if timings is None:
+            return response
+
+        total = time.perf_counter() - g.pop("_started")
+        size = 0 if response.is_streamed else response.calculate_content_length() or 0
+
+        response.headers["Server-Timing"] = ", ".join([
+            f'db;dur={timings["db"] * 1000:.2f};desc="{int(timings["queries"])} queries"',
+            f'serialize;dur={timings["serialize"] * 1000:.2f}',
+            f"total;dur={total * 1000:.2f}",
+        ])
+
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        state = current_app.extensions["instrumentation"]
+        with state.lock:
+            metrics = state.routes[(rule, request.method, response.status_code)]
+            metrics["requests"] += 1
+            metrics["seconds"] += total
+            metrics["db_queries"] += timings["queries"]
+            metrics["db_seconds"] += timings["db"]
+            metrics["serialize_seconds"] += timings["serialize"]
+            metrics["response_bytes"] += size
+        return response
+
+    def metrics(self):
+        """
+        накопленные метрики в текстовом формате Prometheus
+        """
+        series = (
+            ("http_requests_total", "counter", "requests"),
+            ("http_request_seconds_total", "counter", "seconds"),
+            ("db_queries_total", "counter", "db_queries"),
+            ("db_seconds_total", "counter", "db_seconds"),
+            ("serialize_seconds_total", "counter", "serialize_seconds"),
+            ("http_response_bytes_total", "counter", "response_bytes"),
+        )
+        state = current_app.extensions["instrumentation"]
+        with state.lock:
+            routes = {key: dict(values) for key, values in state.routes.items()}
+
+        lines = []
+        for name, kind, key in series:
+            lines.append(f"# TYPE {name} {kind}")
+            for (rule, method, status), values in sorted(routes.items()):
+                labels = f'route="{rule}",method="{method}",status="{status}"'
+                lines.append(f"{name}{{{labels}}} {values[key]:g}")
+        return "\n".join(lines) + "\n", 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,110 @@
+"""
+ссылочная целостность фильмов и справочников (жанров, режиссеров)
+
+movie.genre_id и movie.director_id - внешние ключи (в SQLite проверяются
+при SQLITE_FOREIGN_KEYS), смена id жанра или режиссера переносится
+на фильмы (ON UPDATE CASCADE); что происходит с фильмами при удалении
+жанра или режиссера, задает настройка DIRECTORY_DELETE_MODE:
+    restrict - запись нельзя удалить, пока на нее ссылаются фильмы
+    set_null - у фильмов сбрасывается ссылка на запись
+    cascade  - фильмы удаляются вместе с записью
+
+фильмы меняются одним запросом на пачку id в транзакции удаления,
+в ней же обновляются сводки, movie_view и версия справочников
+"""
+from flask import current_app
+from sqlalchemy import func, select
+
+from app.database import chunks, db
+from app.read_model import DirectoryChanges, refresh_names
+from app.stats import AffectedGroups, refresh_group_stats
+from models import Director, Genre, Movie
+
+RESTRICT = "restrict"
+SET_NULL = "set_null"
+CASCADE = "cascade"
+DELETE_MODES = (RESTRICT, SET_NULL, CASCADE)
+
+# справочник -> колонка фильма со ссылкой на него
+MOVIE_COLUMNS = {
+    Genre: Movie.genre_id,
+    Director: Movie.director_id,
+}
+
+
+def check_delete_mode(config):
+    """
+    проверяет DIRECTORY_DELETE_MODE при создании приложения (ошибка в настройке - ValueError)
+    """
+    mode = config["DIRECTORY_DELETE_MODE"]
+    if mode not in DELETE_MODES:
+        raise ValueError(f"DIRECTORY_DELETE_MODE={mode!r}, допустимые значения: {', '.join(DELETE_MODES)}")
+
+
+def movie_counts(model, ids):
+    """
+    число фильмов, ссылающихся на записи справочника: id -> число (только ненулевые)
+    """
+    column = MOVIE_COLUMNS[model]
+    counts = {}
+    for chunk in chunks(ids):
+        counts.update(
+            db.session.execute(select(column, func.count()).where(column.in_(chunk)).group_by(column)).all()
+        )
+    return counts
+
+
+class DirectoryDelete:
+    """
+    удаление жанров или режиссеров с учетом их фильмов (режим DIRECTORY_DELETE_MODE)
+
+    errors() проверяет записи до удаления, before_write() вызывается до удаления
+    строк справочника, after_write() - после, все в одной транзакции
+    """
+
+    def __init__(self, model, mode=None):
+        self.model = model
+        self.mode = mode or current_app.config["DIRECTORY_DELETE_MODE"]
+        self.changes = DirectoryChanges(model)
+        self.movies = AffectedGroups()
+
+    def errors(self, ids):
+        """
+        записи, которые нельзя удалить: id -> текст ошибки
+        """
+        if self.mode != RESTRICT:
+            return {}
+        return {
+            item_id: f"на запись ссылаются фильмы: {count}"
+            for item_id, count in movie_counts(self.model, ids).items()
+        }
+
+    def before_write(self, ids):
+        self.changes.collect(ids)
+        column = MOVIE_COLUMNS[self.model]
+        movies = Movie.__table__
+        for chunk in chunks(ids):
+            if self.mode == SET_NULL:
+                db.session.execute(movies.update().where(column.in_(chunk)).values({column.key: None}))
+            elif self.mode == CASCADE:
+                self.movies.collect(db.session.execute(select(Movie.id).where(column.in_(chunk))).scalars().all())
+                db.session.execute(movies.delete().where(column.in_(chunk)))
+
+    def after_write(self, ids=()):
+        self.movies.refresh()
+        self.changes.refresh(ids)
+
+
+def reassign_movies(model, from_id, to_id):
+    """
+    переносит все фильмы записи справочника from_id на to_id одним UPDATE,
+    пересчитывает сводки обеих записей и строки фильмов в movie_view;
+    возвращает число перенесенных фильмов
+    """
+    column = MOVIE_COLUMNS[model]
+    result = db.session.execute(
+        Movie.__table__.update().where(column == from_id).values({column.key: to_id})
+    )
+    refresh_group_stats(model, [from_id, to_id])
+    refresh_names(model, [from_id])
+    return result.rowcount
@@ -0,0 +1,272 @@
+"""
+миграции схемы БД
+
+недостающие таблицы создаются по моделям (create_all),
+изменения существующих таблиц и объекты, которых нет в моделях,
+описываются пронумерованными миграциями (они должны быть идемпотентны),
+номер последней примененной миграции хранится в таблице schema_version
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, MetaData, Table, exists, func, inspect, select, sql
+from sqlalchemy.schema import AddConstraint, CreateTable
+
+from app.database import chunks, db
+from app.read_model import refresh_movie_view, refresh_names
+from app.stats import refresh_group_stats, refresh_stats
+from models import Director, Genre
+
+version_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    version_metadata,
+    Column("version", Integer, nullable=False),
+)
+
+MIGRATIONS = []
+
+# документ полнотекстового поиска по фильмам на PostgreSQL: выражение индекса
+# ix_movie_search и запроса должны совпадать, чтобы планировщик использовал индекс
+MOVIE_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+)
+
+
+def migration(version):
+    """
+    регистрирует функцию (connection) как миграцию с номером version
+    """
+    def decorator(function):
+        MIGRATIONS.append((version, function))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return function
+    return decorator
+
+
+def _create_missing_indexes(connection, *table_names):
+    for table_name in table_names:
+        existing = {column["name"] for column in inspect(connection).get_columns(table_name)}
+        for index in db.Model.metadata.tables[table_name].indexes:
+            # индексы по колонкам, которых еще нет, создает миграция, добавляющая колонку
+            if all(column.name in existing for column in index.columns):
+                index.create(connection, checkfirst=True)
+
+
+def _merge_duplicate_names(connection, model, movie_column):
+    """
+    фильмы записей с повторяющимся названием переводятся на запись
+    с наименьшим id, остальные записи удаляются
+    """
+    directory = model.__table__
+    # в старой схеме у movie может не быть колонок модели (updated_at)
+    movie = sql.table("movie", sql.column(movie_column))
+    duplicated = (
+        select(directory.c.name, func.min(directory.c.id))
+        .group_by(directory.c.name)
+        .having(func.count() > 1)
+    )
+    for name, keep_id in connection.execute(duplicated).all():
+        ids = connection.execute(
+            select(directory.c.id).where(directory.c.name == name, directory.c.id != keep_id)
+        ).scalars().all()
+        for chunk in chunks(ids):
+            connection.execute(
+                movie.update().where(movie.c[movie_column].in_(chunk)).values({movie_column: keep_id})
+            )
+            connection.execute(directory.delete().where(directory.c.id.in_(chunk)))
+
+
+@migration(1)
+def add_filter_indexes(connection):
+    """
+    уникальные индексы по названиям жанров и режиссеров (повторяющиеся
+    названия сначала объединяются), индексы по колонкам фильтров и сортировки фильмов
+    """
+    _merge_duplicate_names(connection, Genre, "genre_id")
+    _merge_duplicate_names(connection, Director, "director_id")
+    _create_missing_indexes(connection, "genre", "director", "movie")
+
+
+@migration(2)
+def add_movie_search_index(connection):
+    """
+    полнотекстовый индекс FTS5 по названию и описанию фильмов (только SQLite),
+    синхронизируется с таблицей movie триггерами
+    """
+    if connection.dialect.name != "sqlite":
+        return
+
+    connection.exec_driver_sql(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS movie_fts USING fts5("
+        "title, description, content='movie', content_rowid='id', "
+        "tokenize='unicode61', prefix='2 3')"
+    )
+    connection.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS movie_fts_insert AFTER INSERT ON movie BEGIN "
+        "INSERT INTO movie_fts(rowid, title, description) VALUES (new.id, new.title, new.description); "
+        "END"
+    )
+    connection.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS movie_fts_delete AFTER DELETE ON movie BEGIN "
+        "INSERT INTO movie_fts(movie_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "END"
+    )
+    connection.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS movie_fts_update AFTER UPDATE ON movie BEGIN "
+        "INSERT INTO movie_fts(movie_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "INSERT INTO movie_fts(rowid, title, description) VALUES (new.id, new.title, new.description); "
+        "END"
+    )
+    connection.exec_driver_sql("INSERT INTO movie_fts(movie_fts) VALUES ('rebuild')")
+
+
+@migration(3)
+def add_sort_indexes(connection):
+    """
+    составные индексы (поле, id) для сортировки с keyset-курсором
+    вместо одиночных индексов по year и rating
+    """
+    connection.exec_driver_sql("DROP INDEX IF EXISTS ix_movie_year")
+    connection.exec_driver_sql("DROP INDEX IF EXISTS ix_movie_rating")
+    _create_missing_indexes(connection, "movie")
+
+
+@migration(4)
+def fill_stats(connection):
+    """
+    первичное заполнение сводок по жанрам и режиссерам
+    """
+    refresh_stats(executor=connection)
+
+
+@migration(5)
+def add_movie_updated_at(connection):
+    """
+    время последнего изменения фильма (для выгрузки изменений /movies/export),
+    у существующих фильмов - время миграции
+    """
+    movie = db.Model.metadata.tables["movie"]
+    if "updated_at" not in {column["name"] for column in inspect(connection).get_columns("movie")}:
+        column_type = movie.c.updated_at.type.compile(dialect=connection.dialect)
+        connection.exec_driver_sql(f"ALTER TABLE movie ADD COLUMN updated_at {column_type}")
+        connection.execute(movie.update().values(updated_at=datetime.utcnow()))
+    _create_missing_indexes(connection, "movie")
+
+
+@migration(6)
+def fill_movie_view(connection):
+    """
+    первичное заполнение денормализованной таблицы фильмов movie_view
+    """
+    refresh_movie_view(executor=connection)
+
+
+@migration(7)
+def add_catalogue_version(connection):
+    """
+    строка с номером версии справочников для снимка в памяти (app/snapshot.py)
+    """
+    table = db.Model.metadata.tables["catalogue_version"]
+    if connection.execute(select(table.c.id)).first() is None:
+        connection.execute(table.insert().values(id=1, version=1))
+
+
+def _foreign_keys_match(connection, table):
+    existing = {
+        (tuple(key["constrained_columns"]), key["referred_table"], (key.get("options") or {}).get("onupdate"))
+        for key in inspect(connection).get_foreign_keys(table.name)
+    }
+    expected = {
+        (tuple(column.name for column in key.columns), key.referred_table.name, key.onupdate)
+        for key in table.foreign_key_constraints
+    }
+    return existing == expected
+
+
+def _recreate_foreign_keys(connection, table):
+    """
+    пересоздает внешние ключи таблицы по модели
+    """
+    if connection.dialect.name != "sqlite":
+        quote = connection.dialect.identifier_preparer.quote
+        for key in inspect(connection).get_foreign_keys(table.name):
+            connection.exec_driver_sql(f"ALTER TABLE {quote(table.name)} DROP CONSTRAINT {quote(key['name'])}")
+        for constraint in table.foreign_key_constraints:
+            connection.execute(AddConstraint(constraint))
+        return
+
+    # SQLite не меняет ограничения существующей таблицы: она пересоздается с данными
+    new_name = f"{table.name}_new"
+    ddl = str(CreateTable(table).compile(dialect=connection.dialect))
+    connection.exec_driver_sql(ddl.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {new_name} ", 1))
+    columns = ", ".join(column.name for column in table.columns)
+    connection.exec_driver_sql(f"INSERT INTO {new_name} ({columns}) SELECT {columns} FROM {table.name}")
+    connection.exec_driver_sql(f"DROP TABLE {table.name}")
+    connection.exec_driver_sql(f"ALTER TABLE {new_name} RENAME TO {table.name}")
+    _create_missing_indexes(connection, table.name)
+
+
+@migration(8)
+def add_foreign_keys(connection):
+    """
+    ссылки фильмов на удаленные жанры и режиссеров сбрасываются (со сводками
+    и movie_view), внешние ключи movie пересоздаются по модели (ON UPDATE CASCADE)
+    """
+    movie = db.Model.metadata.tables["movie"]
+    for model, column in ((Genre, movie.c.genre_id), (Director, movie.c.director_id)):
+        orphans = select(column).where(column.isnot(None), ~exists().where(model.id == column)).distinct()
+        ids = connection.execute(orphans).scalars().all()
+        for chunk in chunks(ids):
+            connection.execute(movie.update().where(column.in_(chunk)).values({column.name: None}))
+        refresh_group_stats(model, ids, executor=connection)
+        refresh_names(model, ids, executor=connection)
+
+    if not _foreign_keys_match(connection, movie):
+        _recreate_foreign_keys(connection, movie)
+        # триггеры полнотекстового индекса удалены вместе с таблицей
+        add_movie_search_index(connection)
+
+
+@migration(9)
+def add_movie_search_index_postgresql(connection):
+    """
+    GIN-индекс по tsvector названия и описания фильмов (только PostgreSQL)
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    connection.exec_driver_sql(
+        f"CREATE INDEX IF NOT EXISTS ix_movie_search ON movie USING gin (({MOVIE_SEARCH_DOCUMENT}))"
+    )
+
+
+def current_version(connection):
+    return connection.execute(select(schema_version.c.version)).scalar()
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def run_migrations():
+    """
+    приводит схему БД к текущим моделям, возвращает номер версии схемы
+    """
+    with db.engine.begin() as connection:
+        version_metadata.create_all(connection)
+        db.Model.metadata.create_all(connection)
+
+        version = current_version(connection)
+        if version is None:
+            version = 0
+            connection.execute(schema_version.insert().values(version=version))
+
+        for number, function in MIGRATIONS:
+            if number > version:
+                function(connection)
+                version = number
+                connection.execute(schema_version.update().values(version=version))
+
+    return version
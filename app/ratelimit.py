@@ -0,0 +1,115 @@
+"""
+ограничение частоты запросов (token bucket на клиента и маршрут)
+
+подключается к namespace через decorators=[rate_limiter.limited("<namespace>")],
+лимиты задаются настройкой RATE_LIMITS: namespace -> (запросов, за секунд);
+у каждого клиента (request.remote_addr, за прокси - через werkzeug ProxyFix)
+на каждом маршруте namespace свое ведро емкостью "запросов", которое
+равномерно пополняется за "секунд"; пустое ведро - ответ 429 с Retry-After
+
+ведра хранятся в памяти процесса (MemoryBackend, не больше RATE_LIMIT_MAX_KEYS,
+давно не использованные вытесняются), у каждого процесса и приложения
+(app.extensions["rate_limiter"]) свои лимиты
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request
+
+from app.serialization import json_response
+
+
+class MemoryBackend:
+    """
+    ведра в памяти процесса: ключ -> [токенов, время обновления]
+    """
+
+    def __init__(self, max_keys=10000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, period):
+        """
+        забирает токен из ведра key; возвращает 0, если токен был,
+        иначе через сколько секунд он появится
+        """
+        rate = capacity / period
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [capacity, now]
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+                self._buckets.move_to_end(key)
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / rate
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class RateLimiterState:
+    """
+    лимиты и ведра одного приложения (app.extensions["rate_limiter"])
+    """
+
+    def __init__(self, limits, backend):
+        self.limits = dict(limits)
+        self.backend = backend
+
+
+class RateLimiter:
+    def __init__(self, backend=None):
+        # общее хранилище ведер для всех приложений (None - у каждого приложения свое в памяти)
+        self.backend = backend
+
+    def init_app(self, app):
+        backend = self.backend or MemoryBackend(app.config.get("RATE_LIMIT_MAX_KEYS", 10000))
+        app.extensions["rate_limiter"] = RateLimiterState(app.config.get("RATE_LIMITS", {}), backend)
+
+    @staticmethod
+    def state():
+        """
+        лимиты и ведра текущего приложения
+        """
+        return current_app.extensions["rate_limiter"]
+
+    def limited(self, namespace):
+        """
+        декоратор view-функций namespace
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                state = self.state()
+                limit = state.limits.get(namespace)
+                if not limit:
+                    return view(*args, **kwargs)
+
+                capacity, period = limit
+                key = (request.remote_addr, request.url_rule.rule)
+                retry_after = state.backend.take(key, capacity, period)
+                if retry_after:
+                    headers = {"Retry-After": str(math.ceil(retry_after))}
+                    return json_response("Слишком много запросов", 429, headers)
+                return view(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+
+rate_limiter = RateLimiter()
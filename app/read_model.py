@@ -0,0 +1,125 @@
+"""
+денормализованная таблица фильмов для чтения (movie_view)
+
+строка movie_view - поля MovieSchema фильма с названиями жанра и режиссера,
+поэтому списки фильмов читаются из одной таблицы без JOIN;
+строки пересчитываются в той же транзакции, что и запись:
+    фильмы     - refresh_movie_view (через AffectedGroups из app/stats.py)
+    справочники - refresh_names (через DirectoryChanges), например при переименовании
+"""
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app.database import chunks, db
+from app.snapshot import bump_catalogue_version
+from models import Director, Genre, Movie, MovieView
+
+# справочник -> (колонка id в movie_view, колонка названия в movie_view)
+NAME_COLUMNS = {
+    Genre: (MovieView.genre_id, MovieView.genre),
+    Director: (MovieView.director_id, MovieView.director),
+}
+
+
+def _movie_rows():
+    """
+    строки movie_view, собранные из movie, genre и director
+    """
+    return (
+        select(
+            Movie.id, Movie.title, Movie.description, Movie.trailer, Movie.year, Movie.rating,
+            Movie.genre_id, Genre.name, Movie.director_id, Director.name,
+        )
+        .select_from(Movie)
+        .outerjoin(Genre, Genre.id == Movie.genre_id)
+        .outerjoin(Director, Director.id == Movie.director_id)
+    )
+
+
+def refresh_movie_view(movie_ids=None, executor=None):
+    """
+    пересобирает строки movie_view для указанных фильмов
+    (None - всю таблицу); удаленные фильмы из нее удаляются
+    """
+    executor = executor or db.session
+    table = MovieView.__table__
+    insert = table.insert()
+    columns = [
+        table.c.id, table.c.title, table.c.description, table.c.trailer, table.c.year, table.c.rating,
+        table.c.genre_id, table.c.genre, table.c.director_id, table.c.director,
+    ]
+
+    if movie_ids is None:
+        executor.execute(table.delete())
+        executor.execute(insert.from_select(columns, _movie_rows()))
+        return
+
+    for chunk in chunks(movie_ids):
+        executor.execute(table.delete().where(table.c.id.in_(chunk)))
+        executor.execute(insert.from_select(columns, _movie_rows().where(Movie.id.in_(chunk))))
+
+
+def refresh_names(model, ids, executor=None):
+    """
+    обновляет в movie_view ссылку на жанр или режиссера и его название у фильмов
+    с этими id справочника (до изменения или после): ссылка берется из movie,
+    поэтому учитываются и смена id (ON UPDATE CASCADE), и сброс ссылки при удалении
+    """
+    executor = executor or db.session
+    id_column, name_column = NAME_COLUMNS[model]
+    movie_column = getattr(Movie, id_column.key)
+    reference = select(movie_column).where(Movie.id == MovieView.id).scalar_subquery()
+    name = (
+        select(model.name)
+        .select_from(Movie)
+        .join(model, model.id == movie_column)
+        .where(Movie.id == MovieView.id)
+        .scalar_subquery()
+    )
+    for chunk in chunks(ids):
+        executor.execute(
+            MovieView.__table__.update()
+            .where(id_column.in_(chunk))
+            .values({id_column.key: reference, name_column.key: name})
+        )
+
+
+def touch_movies(model, ids, executor=None):
+    """
+    отмечает фильмы жанров или режиссеров с этими id измененными (Movie.updated_at),
+    чтобы выгрузка изменений (/movies/export) отдала их с новым названием
+    """
+    executor = executor or db.session
+    movie_column = getattr(Movie, NAME_COLUMNS[model][0].key)
+    for chunk in chunks(ids):
+        executor.execute(
+            Movie.__table__.update().where(movie_column.in_(chunk)).values(updated_at=datetime.utcnow())
+        )
+
+
+class DirectoryChanges:
+    """
+    собирает id изменяемых жанров или режиссеров, обновляет их названия в movie_view,
+    время изменения их фильмов и их сводки, увеличивает версию справочников
+
+    collect() вызывается до изменения (старые id), refresh() - после (новые),
+    оба раза в одной транзакции
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.ids = set()
+
+    def collect(self, ids):
+        self.ids.update(ids)
+
+    def refresh(self, ids=()):
+        from app.stats import refresh_group_stats
+
+        db.session.flush()
+        self.collect(ids)
+        refresh_names(self.model, self.ids)
+        touch_movies(self.model, self.ids)
+        refresh_group_stats(self.model, self.ids - {None})
+        bump_catalogue_version()
@@ -0,0 +1,25 @@
+"""
+проверка готовности экземпляра приложения (/ready)
+
+экземпляр готов, если БД доступна и ее схема приведена к текущей версии
+(миграции выполняются отдельно командой migrate, а не при старте)
+"""
+from flask import jsonify
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.database import db
+
+
+def ready():
+    from app.migrations import current_version, latest_version
+
+    expected = latest_version()
+    try:
+        with db.engine.connect() as connection:
+            version = current_version(connection)
+    except SQLAlchemyError:
+        return jsonify(status="unavailable", reason="database"), 503
+
+    if version is None or version < expected:
+        return jsonify(status="unavailable", reason="migrations", schema_version=version, expected=expected), 503
+    return jsonify(status="ready", schema_version=version), 200
@@ -0,0 +1,157 @@
+"""
+маршрутизация чтения на реплики (включается настройкой DATABASE_REPLICA_URLS)
+
+GET-запросы выполняются на репликах по кругу (реплика выбирается один раз
+на запрос, недоступные реплики пропускаются), остальные запросы - на основной БД;
+после записи клиент получает cookie READ_YOUR_WRITES_COOKIE и в течение
+READ_YOUR_WRITES_SECONDS читает с основной БД, чтобы видеть свои изменения
+(такие запросы идут мимо кэша ответов и объединения запросов)
+
+доступность реплики проверяется не чаще раза в REPLICA_HEALTH_CHECK_INTERVAL секунд:
+реплика должна отвечать и иметь таблицу schema_version
+
+для SQLite реплики - копии файла основной БД: при SQLITE_REPLICA_SYNC
+файл копируется (sqlite3 backup) после каждого успешного запроса на запись
+и после команд migrate/seed/import
+
+у каждого приложения свои реплики (app.extensions["replica_router"])
+"""
+import itertools
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g, request
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.database import db, replica_binds
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def reads_own_writes():
+    """
+    запрос клиента, который недавно писал и читает с основной БД: общий кэш
+    ответов и объединение запросов могли получить данные с отстающей реплики
+    """
+    return g.get("_reads_own_writes", False)
+
+
+class ReplicaState:
+    """
+    реплики одного приложения и их доступность (app.extensions["replica_router"])
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.engines = [db.get_engine(app, bind=bind) for bind in replica_binds(app.config)]
+        self.health = {}
+        self.counter = itertools.count()
+        self.sync_lock = threading.Lock()
+
+    def healthy_engine(self):
+        """
+        следующая по кругу доступная реплика (None - читать с основной БД)
+        """
+        for _ in range(len(self.engines)):
+            engine = self.engines[next(self.counter) % len(self.engines)]
+            if self._is_healthy(engine):
+                return engine
+        return None
+
+    def _is_healthy(self, engine):
+        healthy, checked_at = self.health.get(engine, (False, None))
+        now = time.monotonic()
+        if checked_at is None or now - checked_at >= self.app.config["REPLICA_HEALTH_CHECK_INTERVAL"]:
+            healthy = self._check(engine)
+            self.health[engine] = (healthy, now)
+        return healthy
+
+    @staticmethod
+    def _check(engine):
+        from app.migrations import current_version
+
+        try:
+            with engine.connect() as connection:
+                return current_version(connection) is not None
+        except SQLAlchemyError:
+            return False
+
+    def sync(self):
+        """
+        копирует основную БД SQLite на реплики SQLite (замена репликации для разработки)
+        """
+        if not self.engines or not self.app.config["SQLITE_REPLICA_SYNC"]:
+            return
+
+        primary = db.get_engine(self.app)
+        replicas = [engine for engine in self.engines if engine.dialect.name == "sqlite"]
+        if primary.dialect.name != "sqlite" or not replicas:
+            return
+
+        with self.sync_lock:
+            source = sqlite3.connect(primary.url.database)
+            try:
+                for engine in replicas:
+                    target = sqlite3.connect(engine.url.database)
+                    try:
+                        source.backup(target)
+                    finally:
+                        target.close()
+            finally:
+                source.close()
+        # реплики, недоступные до копирования, проверяются заново
+        self.health.clear()
+
+
+class ReplicaRouter:
+    def init_app(self, app):
+        state = app.extensions["replica_router"] = ReplicaState(app)
+        if not state.engines:
+            return
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    @staticmethod
+    def state(app=None):
+        """
+        реплики приложения (по умолчанию текущего)
+        """
+        return (app or current_app).extensions["replica_router"]
+
+    def _before_request(self):
+        g._reads_own_writes = self.is_sticky()
+        if request.method in READ_METHODS and not g._reads_own_writes:
+            g._read_engine = self.state().healthy_engine()
+
+    def _after_request(self, response):
+        if request.method not in READ_METHODS and response.status_code < 400:
+            self.state().sync()
+            window = current_app.config["READ_YOUR_WRITES_SECONDS"]
+            if window > 0:
+                response.set_cookie(
+                    current_app.config["READ_YOUR_WRITES_COOKIE"],
+                    str(int(time.time() + window)), max_age=window, httponly=True,
+                )
+        return response
+
+    @staticmethod
+    def is_sticky():
+        """
+        клиент недавно писал в БД и еще должен читать с основной
+        """
+        try:
+            until = float(request.cookies.get(current_app.config["READ_YOUR_WRITES_COOKIE"], 0))
+        except ValueError:
+            return False
+        return until > time.time()
+
+    def sync(self, app=None):
+        """
+        копирует основную БД SQLite приложения на его реплики SQLite
+        """
+        self.state(app).sync()
+
+
+replica_router = ReplicaRouter()
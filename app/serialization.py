@@ -0,0 +1,188 @@
+"""
+быстрая сериализация списков фильмов
+
+вместо загрузки объектов Movie и MovieSchema.dump запрос сразу выбирает
+нужные колонки, а строки превращаются в словари с полями в порядке MovieSchema;
+списки читаются из денормализованной таблицы movie_view (одна таблица, без JOIN),
+выгрузка - из movie с полями Pluck через LEFT JOIN;
+MovieSchema остается единственным описанием полей ответа;
+names - поля ответа из параметра fields (None - все), из БД выбираются только они
+
+кодировщик JSON задается настройкой JSON_ENCODER:
+    json   - json.dumps с настройками flask-restx, ответ совпадает побайтно
+    orjson - orjson (если установлен), тот же JSON, но без \\u-экранирования и отступов
+"""
+import json
+from functools import lru_cache
+
+from flask import current_app
+from marshmallow import fields
+from sqlalchemy import select
+from sqlalchemy.orm import load_only, noload
+
+from app.database import db
+from app.instrumentation import track
+from models import Movie, MovieSchema, MovieView
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+movie_schema = MovieSchema()
+movies_schema = MovieSchema(many=True)
+
+
+def _movie_columns():
+    """
+    колонки запроса для каждого поля MovieSchema и связи для JOIN
+    """
+    columns = []
+    joins = []
+    for name, field in movie_schema.fields.items():
+        attribute = getattr(Movie, field.attribute or name)
+        if isinstance(field, fields.Pluck):
+            related = attribute.property.mapper.class_
+            columns.append(getattr(related, field.field_name).label(name))
+            joins.append(attribute)
+        else:
+            columns.append(attribute.label(name))
+    return columns, joins
+
+
+MOVIE_FIELDS = list(movie_schema.fields)
+MOVIE_COLUMNS, MOVIE_JOINS = _movie_columns()
+# колонки movie_view называются так же, как поля MovieSchema
+MOVIE_VIEW_COLUMNS = [getattr(MovieView, name) for name in MOVIE_FIELDS]
+
+
+def is_fast():
+    return current_app.config["FAST_SERIALIZATION"]
+
+
+def movie_source():
+    """
+    модель, по колонкам которой фильтруются и сортируются списки из movies_query()
+    """
+    return MovieView if is_fast() else Movie
+
+
+def movie_view_columns(names=None):
+    """
+    колонки movie_view для полей names в том же порядке
+    """
+    return MOVIE_VIEW_COLUMNS if names is None else [getattr(MovieView, name) for name in names]
+
+
+def movie_load_options(names):
+    """
+    опции запроса объектов Movie: загружаются только колонки полей names,
+    связи остальных полей Pluck не загружаются
+    """
+    columns = []
+    options = []
+    for name, field in movie_schema.fields.items():
+        attribute = getattr(Movie, field.attribute or name)
+        if isinstance(field, fields.Pluck):
+            if name in names:
+                columns.extend(getattr(Movie, column.key) for column in attribute.property.local_columns)
+            else:
+                options.append(noload(attribute))
+        elif name in names:
+            columns.append(attribute)
+    return [load_only(*columns), *options]
+
+
+@lru_cache(maxsize=64)
+def _projected_schema(names):
+    return MovieSchema(many=True, only=names)
+
+
+def projected_schema(names=None):
+    """
+    MovieSchema(many=True) только с полями names
+    """
+    return movies_schema if names is None else _projected_schema(tuple(names))
+
+
+def movie_rows_query():
+    """
+    запрос фильмов в виде кортежей колонок в порядке полей MovieSchema
+    """
+    query = db.session.query(*MOVIE_COLUMNS).select_from(Movie)
+    for relationship in MOVIE_JOINS:
+        query = query.outerjoin(relationship)
+    return query
+
+
+def movie_view_statement(names=None):
+    """
+    select() строк movie_view в порядке полей MovieSchema (для асинхронного движка)
+    """
+    return select(*movie_view_columns(names))
+
+
+def movies_query(names=None):
+    """
+    запрос фильмов для списков: строки movie_view в быстром режиме, иначе объекты Movie
+    (колонки для фильтров - у модели movie_source())
+    """
+    if is_fast():
+        return db.session.query(*movie_view_columns(names))
+
+    query = db.session.query(Movie)
+    if names is not None:
+        query = query.options(*movie_load_options(names))
+    return query
+
+
+def dump_movies(movies, names=None):
+    """
+    сериализует результат movies_query() в список словарей с полями names
+    """
+    if is_fast():
+        return dump_movie_rows(movies, names)
+    return projected_schema(names).dump(movies)
+
+
+def dump_movie_rows(rows, names=None):
+    """
+    сериализует строки movie_rows_query() или movie_view в список словарей;
+    колонки сверх names (выбранные для курсора) в ответ не попадают
+    """
+    with track("serialize"):
+        return [dict(zip(names or MOVIE_FIELDS, row)) for row in rows]
+
+
+def dumps(data):
+    """
+    кодирует данные в JSON так же, как flask-restx (с переводом строки в конце)
+    """
+    if current_app.config["JSON_ENCODER"] == "orjson" and orjson is not None:
+        return orjson.dumps(data) + b"\n"
+
+    settings = current_app.config.get("RESTX_JSON", {})
+    if current_app.debug:
+        settings = dict(settings)
+        settings.setdefault("indent", 4)
+    return (json.dumps(data, **settings) + "\n").encode()
+
+
+def dumps_line(data):
+    """
+    кодирует одну запись NDJSON
+    """
+    if current_app.config["JSON_ENCODER"] == "orjson" and orjson is not None:
+        return orjson.dumps(data) + b"\n"
+    return (json.dumps(data, ensure_ascii=False) + "\n").encode()
+
+
+def json_response(data, status=200, headers=None):
+    """
+    готовый JSON-ответ (flask-restx его не перекодирует)
+    """
+    with track("serialize"):
+        body = dumps(data)
+    response = current_app.response_class(body, status, mimetype="application/json")
+    response.headers.extend(headers or {})
+    return response
@@ -0,0 +1,164 @@
+"""
+снимок справочников в памяти процесса (включается настройкой CATALOGUE_SNAPSHOT)
+
+списки жанров и режиссеров хранятся в компактных объектах (__slots__)
+вместе с готовым JSON ответа, поэтому /genres/ и /directors/ отдаются без БД;
+каждая запись в справочники увеличивает номер версии в таблице catalogue_version
+в той же транзакции; процесс сверяет номер не чаще раза в SNAPSHOT_CHECK_INTERVAL_MS
+и при изменении строит новый снимок целиком и подменяет ссылку на него
+(запросы, начатые со старым снимком, дочитывают его);
+у каждого приложения свой снимок (app.extensions["catalogue_snapshot"])
+"""
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.database import db
+from app.serialization import dumps
+from models import CatalogueVersion, Director, DirectorSchema, Genre, GenreSchema
+
+# справочник -> схема списка
+SCHEMAS = {
+    Genre: GenreSchema(many=True),
+    Director: DirectorSchema(many=True),
+}
+
+
+def bump_catalogue_version(executor=None):
+    """
+    отмечает изменение справочников (вызывается в транзакции записи)
+    """
+    executor = executor or db.session
+    table = CatalogueVersion.__table__
+    executor.execute(table.update().values(version=table.c.version + 1))
+    if executor is db.session:
+        # снимок этого процесса сверяется сразу после фиксации транзакции
+        db.session.info["catalogue_changed"] = True
+    else:
+        catalogue_snapshot.invalidate()
+
+
+def current_catalogue_version(executor=None):
+    executor = executor or db.session
+    return executor.execute(select(CatalogueVersion.version)).scalar()
+
+
+class Entry:
+    __slots__ = ("id", "name")
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+
+class DirectorySnapshot:
+    __slots__ = ("entries", "by_id", "body")
+
+    def __init__(self, entries, schema):
+        self.entries = tuple(entries)
+        self.by_id = {entry.id: entry for entry in self.entries}
+        # тело ответа /genres/ (/directors/), как его кодирует flask-restx
+        self.body = dumps(schema.dump(self.entries)) if self.entries else None
+
+
+class Snapshot:
+    __slots__ = ("version", "directories")
+
+    def __init__(self, version, directories):
+        self.version = version
+        self.directories = directories
+
+
+class SnapshotState:
+    """
+    снимок справочников одного приложения (app.extensions["catalogue_snapshot"])
+    """
+
+    def __init__(self, enabled, check_interval):
+        self.enabled = enabled
+        self.check_interval = check_interval
+        self.snapshot = None
+        self.checked_at = None
+        self.lock = threading.Lock()
+
+
+class CatalogueSnapshot:
+    def init_app(self, app):
+        app.extensions["catalogue_snapshot"] = SnapshotState(
+            app.config["CATALOGUE_SNAPSHOT"], app.config["SNAPSHOT_CHECK_INTERVAL_MS"] / 1000
+        )
+
+    @staticmethod
+    def state():
+        """
+        снимок текущего приложения
+        """
+        return current_app.extensions["catalogue_snapshot"]
+
+    def invalidate(self):
+        """
+        сверить версию при следующем обращении (после записи в этом процессе)
+        """
+        if has_app_context() and "catalogue_snapshot" in current_app.extensions:
+            self.state().checked_at = None
+
+    @staticmethod
+    def _build(version):
+        directories = {}
+        for model, schema in SCHEMAS.items():
+            rows = db.session.execute(select(model.id, model.name).order_by(model.id))
+            directories[model] = DirectorySnapshot((Entry(*row) for row in rows), schema)
+        return Snapshot(version, directories)
+
+    def get(self):
+        """
+        актуальный снимок (при необходимости сверяет версию и перестраивает)
+        """
+        state = self.state()
+        snapshot = state.snapshot
+        now = time.monotonic()
+        if snapshot is not None and state.checked_at is not None and now - state.checked_at < state.check_interval:
+            return snapshot
+
+        # перестраивает один поток, остальные пока отдают прежний снимок
+        if not state.lock.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            with db.session.begin():
+                version = current_catalogue_version()
+                snapshot = state.snapshot
+                if snapshot is None or snapshot.version != version:
+                    snapshot = self._build(version)
+                    state.snapshot = snapshot
+            state.checked_at = now
+            return snapshot
+        finally:
+            state.lock.release()
+
+    def list_response(self, model):
+        """
+        ответ списка справочника из снимка, None - снимок выключен
+        """
+        if not self.state().enabled:
+            return None
+        body = self.get().directories[model].body
+        if body is None:
+            return current_app.response_class(dumps(""), 404, mimetype="application/json")
+        return current_app.response_class(body, 200, mimetype="application/json")
+
+
+catalogue_snapshot = CatalogueSnapshot()
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    if session.info.pop("catalogue_changed", False):
+        catalogue_snapshot.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session):
+    session.info.pop("catalogue_changed", None)
@@ -0,0 +1,127 @@
+"""
+сводки по жанрам и режиссерам (число фильмов, средний и максимальный рейтинг)
+
+сводки хранятся в таблицах genre_stats и director_stats и пересчитываются
+только для тех жанров и режиссеров, чьи фильмы изменились
+"""
+from sqlalchemy import func, select
+
+from app.database import chunks, db
+from app.read_model import refresh_movie_view
+from models import Director, DirectorStats, Genre, GenreStats, Movie
+
+# справочник -> (таблица сводки, колонка фильма со ссылкой на справочник)
+STATS = {
+    Genre: (GenreStats, Movie.genre_id),
+    Director: (DirectorStats, Movie.director_id),
+}
+
+
+def _refresh(executor, model, ids):
+    stats_model, group_column = STATS[model]
+    table = stats_model.__table__
+    key = table.c[group_column.key]
+
+    aggregates = (
+        select(group_column, func.count(Movie.id), func.avg(Movie.rating), func.max(Movie.rating))
+        .where(group_column.isnot(None))
+        .group_by(group_column)
+    )
+    insert = table.insert()
+    columns = [key, table.c.movie_count, table.c.avg_rating, table.c.max_rating]
+
+    if ids is None:
+        executor.execute(table.delete())
+        executor.execute(insert.from_select(columns, aggregates))
+        return
+
+    for chunk in chunks(ids):
+        executor.execute(table.delete().where(key.in_(chunk)))
+        executor.execute(insert.from_select(columns, aggregates.where(group_column.in_(chunk))))
+
+
+def refresh_stats(genre_ids=None, director_ids=None, executor=None):
+    """
+    пересчитывает сводки для указанных жанров и режиссеров
+    (None - пересчет всех сводок таблицы)
+    """
+    executor = executor or db.session
+    _refresh(executor, Genre, genre_ids)
+    _refresh(executor, Director, director_ids)
+
+
+def refresh_group_stats(model, ids, executor=None):
+    """
+    пересчитывает сводки для указанных записей справочника model (Genre или Director)
+    """
+    _refresh(executor or db.session, model, ids)
+
+
+class AffectedGroups:
+    """
+    собирает изменяемые фильмы, их жанры и режиссеров, пересчитывает
+    сводки и строки фильмов в movie_view (app/read_model.py)
+
+    collect() вызывается до изменения (старые жанр и режиссер фильмов),
+    refresh() - после (новые), оба раза в одной транзакции
+    """
+
+    def __init__(self, executor=None):
+        self.executor = executor or db.session
+        self.movie_ids = set()
+        self.genre_ids = set()
+        self.director_ids = set()
+
+    def collect(self, movie_ids):
+        movie_ids = [movie_id for movie_id in movie_ids if movie_id is not None]
+        self.movie_ids.update(movie_ids)
+        for chunk in chunks(movie_ids):
+            rows = self.executor.execute(
+                select(Movie.genre_id, Movie.director_id).where(Movie.id.in_(chunk))
+            )
+            for genre_id, director_id in rows:
+                self.genre_ids.add(genre_id)
+                self.director_ids.add(director_id)
+
+    def update(self, other):
+        """
+        добавляет фильмы и группы, собранные другим AffectedGroups
+        """
+        self.movie_ids.update(other.movie_ids)
+        self.genre_ids.update(other.genre_ids)
+        self.director_ids.update(other.director_ids)
+
+    def refresh(self, movie_ids=()):
+        if self.executor is db.session:
+            db.session.flush()
+        self.collect(movie_ids)
+        refresh_stats(self.genre_ids - {None}, self.director_ids - {None}, executor=self.executor)
+        refresh_movie_view(self.movie_ids, executor=self.executor)
+
+
+def _stats_columns(model):
+    stats_model, group_column = STATS[model]
+    columns = (
+        model.id.label(group_column.key),
+        model.name,
+        func.coalesce(stats_model.movie_count, 0).label("movie_count"),
+        stats_model.avg_rating,
+        stats_model.max_rating,
+    )
+    return columns, stats_model, getattr(stats_model, group_column.key) == model.id
+
+
+def stats_query(model):
+    """
+    запрос сводок по всем записям справочника (без фильмов - нулевые сводки)
+    """
+    columns, stats_model, onclause = _stats_columns(model)
+    return db.session.query(*columns).outerjoin(stats_model, onclause).order_by(model.id)
+
+
+def stats_statement(model):
+    """
+    то же, что stats_query(), в виде select() (для асинхронного движка)
+    """
+    columns, stats_model, onclause = _stats_columns(model)
+    return select(*columns).outerjoin(stats_model, onclause).order_by(model.id)
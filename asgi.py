@@ -0,0 +1,8 @@
+"""
+точка входа для ASGI-сервера (например, uvicorn asgi:app) - асинхронный режим для чтения,
+см. app/async_api.py; профиль конфига берется из APP_ENV (по умолчанию production)
+"""
+from app.async_api import AsyncApi
+from main import create_app
+
+app = AsyncApi(create_app())
@@ -0,0 +1,217 @@
+"""
+нагрузочный бенчмарк API
+
+каталог из --movies синтетических фильмов (bench/catalogue.py),
+каждый эндпоинт прогоняется через Flask test client и/или через
+настоящий WSGI-сервер (werkzeug, потоки) с --concurrency клиентами;
+для каждого эндпоинта измеряются запросы/с, p50/p99 задержки и
+число SQL-запросов на один HTTP-запрос
+
+запуск:
+    python -m bench.api --movies 100000 --output bench.json
+    python -m bench.api --movies 100000 --compare bench.json
+"""
+import argparse
+import http.client
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.serving import make_server
+
+from bench.catalogue import create_bench_app
+
+HOST = "127.0.0.1"
+
+
+def endpoints(movies_count):
+    middle = movies_count // 2
+    return [
+        ("GET", "/movies/"),
+        ("GET", "/movies/?page=200"),
+        ("GET", f"/movies/?after_id={middle}"),
+        ("GET", f"/movies/?after_id={middle}&limit=100"),
+        ("GET", "/movies/?genre_id=4&year_from=2010&sort=rating&order=desc"),
+        ("GET", f"/movies/{middle}"),
+        ("GET", f"/movies/search?q={quote('охотник')}"),
+        ("GET", "/genres/"),
+        ("GET", "/genres/4"),
+        ("GET", "/genres/stats"),
+        ("GET", "/directors/"),
+        ("GET", "/directors/2"),
+        ("GET", "/directors/stats"),
+        ("PUT", f"/movies/{middle}"),
+    ]
+
+
+def put_body(movie_id):
+    return {
+        "id": movie_id, "title": f"Фильм {movie_id}", "description": "описание", "trailer": "",
+        "year": 2000, "rating": 5.0, "genre": "Драма", "director": "Квентин Тарантино",
+    }
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(Engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def _summary(name, client, latencies, elapsed, queries):
+    return {
+        "endpoint": name,
+        "client": client,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+        "queries_per_request": round(queries / len(latencies), 2),
+    }
+
+
+def run_test_client(app, counter, method, url, requests):
+    client = app.test_client()
+    body = put_body(int(url.rsplit("/", 1)[-1])) if method == "PUT" else None
+    latencies = []
+    queries = counter.count
+    started = time.perf_counter()
+    for _ in range(requests):
+        request_started = time.perf_counter()
+        response = client.open(url, method=method, json=body)
+        response.get_data()
+        latencies.append(time.perf_counter() - request_started)
+    elapsed = time.perf_counter() - started
+    return _summary(f"{method} {url}", "test_client", latencies, elapsed, counter.count - queries)
+
+
+def run_wsgi(port, counter, method, url, requests, concurrency):
+    body = put_body(int(url.rsplit("/", 1)[-1])) if method == "PUT" else None
+    payload = json.dumps(body).encode() if body else None
+    headers = {"Content-Type": "application/json"} if body else {}
+    local = threading.local()
+
+    def send(_):
+        if not hasattr(local, "connection"):
+            local.connection = http.client.HTTPConnection(HOST, port)
+        request_started = time.perf_counter()
+        local.connection.request(method, url, body=payload, headers=headers)
+        local.connection.getresponse().read()
+        return time.perf_counter() - request_started
+
+    queries = counter.count
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        latencies = list(executor.map(send, range(requests)))
+    elapsed = time.perf_counter() - started
+    return _summary(f"{method} {url}", f"wsgi_x{concurrency}", latencies, elapsed, counter.count - queries)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """
+    печатает изменение rps и p99 относительно сохраненного прогона
+    """
+    with open(baseline_path, encoding="utf-8") as file:
+        baseline = {(item["endpoint"], item["client"]): item for item in json.load(file)["results"]}
+
+    for item in results:
+        previous = baseline.get((item["endpoint"], item["client"]))
+        if previous is None:
+            continue
+        print(
+            f"{item['client']:>14} {item['endpoint']:<60} "
+            f"rps {previous['rps']:>9} -> {item['rps']:>9} ({item['rps'] / previous['rps'] - 1:+.0%})  "
+            f"p99 {previous['p99_ms']:>8} -> {item['p99_ms']:>8} ms  "
+            f"sql {previous['queries_per_request']} -> {item['queries_per_request']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--movies", type=int, default=10000, help="размер каталога (10^4 - 10^6)")
+    parser.add_argument("--requests", type=int, default=200, help="запросов на эндпоинт")
+    parser.add_argument("--concurrency", type=int, default=8, help="параллельных клиентов WSGI")
+    parser.add_argument("--client", choices=["test_client", "wsgi", "both"], default="both")
+    parser.add_argument("--cache", action="store_true", help="не выключать кэш ответов")
+    parser.add_argument("--coalesce", action="store_true", help="не выключать объединение одинаковых запросов")
+    parser.add_argument("--snapshot", action="store_true", help="не выключать снимок справочников")
+    parser.add_argument("--output", help="файл для результатов (JSON)")
+    parser.add_argument("--compare", help="файл результатов предыдущего прогона")
+    args = parser.parse_args()
+
+    # по умолчанию слои в памяти процесса выключены, чтобы каждый запрос доходил до БД
+    settings = {}
+    if not args.cache:
+        settings["RESPONSE_CACHE_SIZE"] = 0
+    if not args.coalesce:
+        settings["COALESCE_NAMESPACES"] = []
+    if not args.snapshot:
+        settings["CATALOGUE_SNAPSHOT"] = False
+    app = create_bench_app(args.movies, **settings)
+    counter = QueryCounter()
+
+    results = []
+    if args.client in ("test_client", "both"):
+        for method, url in endpoints(args.movies):
+            results.append(run_test_client(app, counter, method, url, args.requests))
+
+    if args.client in ("wsgi", "both"):
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = make_server(HOST, 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            for method, url in endpoints(args.movies):
+                results.append(run_wsgi(server.server_port, counter, method, url, args.requests, args.concurrency))
+        finally:
+            server.shutdown()
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "movies": args.movies,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "cache": args.cache,
+            "coalesce": args.coalesce,
+            "snapshot": args.snapshot,
+            "timestamp": int(time.time()),
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=4)
+    if args.compare:
+        compare(results, args.compare)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+бенчмарк асинхронного режима (ASGI) против WSGI при большом числе соединений
+
+оба сервера запускаются в отдельных процессах над одним синтетическим каталогом
+(bench/catalogue.py): WSGI - Flask-приложение в werkzeug с потоками,
+ASGI - AsyncApi (app/async_api.py) в uvicorn; нагрузку создает асинхронный
+клиент с --connections одновременными keep-alive соединениями (HTTP/1.1),
+для каждого GET-эндпоинта измеряются запросы/с, p50/p99 задержки и ошибки
+
+запуск:
+    python -m bench.asgi --movies 10000 --connections 1000 --output asgi.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import urllib.request
+
+from bench.api import HOST, _git_commit, _percentile, endpoints
+
+SERVERS = {"wsgi": 8601, "asgi": 8602}
+
+
+def serve(kind, port, movies_count, pool_size):
+    """
+    запускает сервер над бенчмарк-базой (выполняется в дочернем процессе)
+    """
+    from bench.catalogue import create_bench_app
+
+    # в ASGI-режиме нет кэша ответов, объединения запросов и снимка справочников,
+    # у WSGI они выключаются, чтобы сравнение было на равных
+    settings = {
+        "RESPONSE_CACHE_SIZE": 0, "COALESCE_NAMESPACES": [], "CATALOGUE_SNAPSHOT": False, "DB_POOL_SIZE": pool_size,
+    }
+    app = create_bench_app(movies_count, **settings)
+    if kind == "wsgi":
+        from werkzeug.serving import make_server
+
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        make_server(HOST, port, app, threaded=True).serve_forever()
+    else:
+        import uvicorn
+        from app.async_api import AsyncApi
+
+        uvicorn.run(AsyncApi(app), host=HOST, port=port, log_level="error", backlog=4096)
+
+
+async def _request(reader, writer, url):
+    writer.write(f"GET {url} HTTP/1.1\r\nHost: {HOST}\r\n\r\n".encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("соединение закрыто сервером")
+
+    length, close = 0, False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "connection" and value.strip().lower() == "close":
+            close = True
+    await reader.readexactly(length)
+    return int(status_line.split()[1]), close
+
+
+async def load(port, url, connections, requests):
+    """
+    выполняет requests запросов url через connections одновременных соединений
+    """
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal errors, remaining
+        reader = writer = None
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(HOST, port)
+                status, close = await _request(reader, writer, url)
+                if close:
+                    writer.close()
+                    writer = None
+                if status >= 400:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError):
+                errors += 1
+                writer = None
+        if writer is not None:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(connections)])
+    elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def _wait_ready(port, timeout=600):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://{HOST}:{port}/ready", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"сервер на порту {port} не готов")
+
+
+def run_server(kind, args):
+    port = SERVERS[kind]
+    command = [
+        sys.executable, "-m", "bench.asgi", "--serve", kind, "--port", str(port),
+        "--movies", str(args.movies), "--pool-size", str(args.pool_size),
+    ]
+    process = subprocess.Popen(command)
+    results = []
+    try:
+        _wait_ready(port)
+        for method, url in endpoints(args.movies):
+            if method != "GET":
+                continue
+            latencies, errors, elapsed = asyncio.run(load(port, url, args.connections, args.requests))
+            result = {
+                "endpoint": url,
+                "server": kind,
+                "connections": args.connections,
+                "requests": len(latencies),
+                "errors": errors,
+                "rps": round(len(latencies) / elapsed, 1),
+                "p50_ms": round(_percentile(latencies, 50) * 1000, 3) if latencies else None,
+                "p99_ms": round(_percentile(latencies, 99) * 1000, 3) if latencies else None,
+            }
+            print(json.dumps(result, ensure_ascii=False), file=sys.stderr)
+            results.append(result)
+    finally:
+        process.terminate()
+        process.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--movies", type=int, default=10000, help="размер каталога")
+    parser.add_argument("--connections", type=int, default=1000, help="одновременных соединений")
+    parser.add_argument("--requests", type=int, default=5000, help="запросов на эндпоинт")
+    parser.add_argument("--pool-size", type=int, default=10, help="размер пула соединений с БД")
+    parser.add_argument("--servers", nargs="+", choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument("--output", help="файл для результатов (JSON)")
+    parser.add_argument("--serve", choices=list(SERVERS), help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.movies, args.pool_size)
+        return
+
+    # база создается один раз, до запуска серверов
+    from bench.catalogue import create_bench_app
+
+    create_bench_app(args.movies)
+
+    results = []
+    for kind in args.servers:
+        results.extend(run_server(kind, args))
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "movies": args.movies,
+            "connections": args.connections,
+            "requests": args.requests,
+            "pool_size": args.pool_size,
+            "timestamp": int(time.time()),
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=4)
+    print(json.dumps(report, ensure_ascii=False, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+синтетический каталог для бенчмарков
+
+фильмы строятся по образцу app/data.py (те же поля, жанры и режиссеры),
+годы, рейтинги и ссылки на жанр/режиссера выбираются случайно с фиксированным seed
+"""
+import os
+import random
+import tempfile
+
+from app.data import data
+
+
+def synthetic_catalogue(movies_count, seed=0):
+    """
+    словарь в формате app/data.py с movies_count фильмами (фильмы - генератор)
+    """
+    rnd = random.Random(seed)
+    samples = data["movies"]
+
+    def movies():
+        for pk in range(1, movies_count + 1):
+            sample = samples[(pk - 1) % len(samples)]
+            yield dict(
+                sample,
+                pk=pk,
+                title=f"{sample['title']} {pk}",
+                year=rnd.randint(1950, 2024),
+                rating=round(rnd.uniform(0, 10), 1),
+                genre_id=rnd.choice(data["genres"])["pk"],
+                director_id=rnd.choice(data["directors"])["pk"],
+            )
+
+    return {"genres": data["genres"], "directors": data["directors"], "movies": movies()}
+
+
+def bench_db_path(movies_count):
+    return os.path.join(tempfile.gettempdir(), f"movies_bench_{movies_count}.db")
+
+
+def create_bench_app(movies_count, db_path=None, config_name="production", **settings):
+    """
+    приложение над отдельной SQLite-базой с синтетическим каталогом;
+    база создается один раз и переиспользуется между запусками
+    """
+    from main import create_app, migrate
+    from app.config import get_config
+    from app.database import db
+    from app.importer import import_data
+    from models import Movie
+
+    config = get_config(config_name)
+    config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path or bench_db_path(movies_count)}"
+    for name, value in settings.items():
+        setattr(config, name, value)
+
+    app = create_app(config)
+    with app.app_context():
+        migrate()
+        if db.session.query(Movie).count() != movies_count:
+            import_data(synthetic_catalogue(movies_count))
+        db.session.remove()
+    return app
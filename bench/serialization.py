@@ -0,0 +1,70 @@
+"""
+сравнение сериализации списка фильмов:
+    schema - объекты Movie + MovieSchema.dump + json (как flask-restx)
+    fast   - кортежи колонок + json (тот же ответ побайтно)
+    orjson - кортежи колонок + orjson
+
+запуск: python -m bench.serialization [--rows 5 100 10000] [--repeat 20]
+результат - JSON со временем (мс) на одну выдачу
+"""
+import argparse
+import json
+import statistics
+import time
+
+from app.database import db
+from app.serialization import dumps, movie_rows_query, movies_schema, MOVIE_FIELDS, orjson
+from bench.catalogue import create_bench_app
+from models import Movie
+
+
+def _schema(rows):
+    movies = db.session.query(Movie).order_by(Movie.id).limit(rows).all()
+    return dumps(movies_schema.dump(movies))
+
+
+def _fast(rows):
+    movies = movie_rows_query().order_by(Movie.id).limit(rows).all()
+    return dumps([dict(zip(MOVIE_FIELDS, row)) for row in movies])
+
+
+def _orjson(rows):
+    movies = movie_rows_query().order_by(Movie.id).limit(rows).all()
+    return orjson.dumps([dict(zip(MOVIE_FIELDS, row)) for row in movies]) + b"\n"
+
+
+def _measure(function, rows, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(rows)
+        timings.append((time.perf_counter() - started) * 1000)
+        db.session.rollback()
+        db.session.expunge_all()
+    return round(statistics.median(timings), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[5, 100, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_bench_app(max(args.rows))
+    paths = {"schema": _schema, "fast": _fast}
+    if orjson is not None:
+        paths["orjson"] = _orjson
+
+    results = []
+    with app.test_request_context():
+        for rows in args.rows:
+            assert _schema(rows) == _fast(rows)
+            result = {"rows": rows}
+            result.update({name: _measure(function, rows, args.repeat) for name, function in paths.items()})
+            results.append(result)
+
+    print(json.dumps({"unit": "ms", "results": results}, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,68 +1,111 @@
+import argparse
+import json
+
 from flask import Flask
 from flask_restx import Api
 
-from app.data import data
-from app.config import Config
-from app.database import db
-from views.directors import directors_ns
-from views.genres import genres_ns
-from views.movies import movies_ns
-from models import Movie, Director, Genre
+from app.cache import response_cache
+from app.coalescing import request_coalescer
+from app.compression import compression
+from app.config import Config, get_config
+from app.database import init_db
+from app.instrumentation import instrumentation
+from app.replicas import replica_router
+from app.readiness import ready
 
 
-def create_app(config: Config):
+def create_app(config: Config = None):
+    """
+    создает и настраивает приложение, схему и данные БД не трогает
+    (для этого есть команды migrate и seed)
+    """
     application = Flask(__name__)  # инициализация(создание) приложения
-    application.config.from_object(config)  # конфигурирование приложения
-    application.app_context().push() # создание app_context для приложения чтобы можно было работать с бд
+    application.config.from_object(config or get_config())  # конфигурирование приложения
+    configure_app(application)
     return application
 
 
 def configure_app(application: Flask):  # конфигурирование приложения
-    db.init_app(application)  # подключение БД
+    # views (а через них модели и утилиты) импортируются только при сборке приложения,
+    # как и модули, которые сами импортируют модели
+    from app.integrity import check_delete_mode
+    from app.ratelimit import rate_limiter
+    from app.snapshot import catalogue_snapshot
+    from views.directors import directors_ns
+    from views.genres import genres_ns
+    from views.movies import movies_ns
+
+    check_delete_mode(application.config)  # режим удаления жанров и режиссеров
+    init_db(application)  # подключение БД
+    replica_router.init_app(application)  # чтение с реплик (если заданы)
+    response_cache.init_app(application)  # кэш ответов
+    request_coalescer.init_app(application)  # объединение одинаковых запросов
+    rate_limiter.init_app(application)  # ограничение частоты запросов
+    catalogue_snapshot.init_app(application)  # снимок справочников в памяти
+    instrumentation.init_app(application)  # метрики запросов (если включены)
+    compression.init_app(application)  # сжатие ответов (после метрик: в них размер сжатого ответа)
+    application.add_url_rule("/ready", "ready", ready)  # проверка готовности
 
     api = Api(application)  # создание API
+    instrumentation.init_api(api)
     api.add_namespace(directors_ns)  # добавление namespace
     api.add_namespace(genres_ns)
     api.add_namespace(movies_ns)
 
 
+def migrate():
+    """
+    приводит схему БД к моделям, возвращает номер версии схемы
+    """
+    from app.migrations import run_migrations
+
+    return {"schema_version": run_migrations()}
+
+
 def create_data():
-    with db.session.begin():
-        db.drop_all()
-        db.create_all()
-
-        for movie in data["movies"]:
-            m = Movie(
-                id=movie["pk"],
-                title=movie["title"],
-                description=movie["description"],
-                trailer=movie["trailer"],
-                year=movie["year"],
-                rating=movie["rating"],
-                genre_id=movie["genre_id"],
-                director_id=movie["director_id"],
-            )
-            db.session.add(m)
-
-        for director in data["directors"]:
-            d = Director(
-                id=director["pk"],
-                name=director["name"],
-            )
-            db.session.add(d)
-
-        for genre in data["genres"]:
-            d = Genre(
-                id=genre["pk"],
-                name=genre["name"],
-            )
-            db.session.add(d)
+    """
+    загружает данные из app/data.py
+    (неизменившиеся записи пропускаются, существующие данные не удаляются)
+    """
+    from app.data import data
+    from app.importer import import_data
+
+    return import_data(data)
+
+
+def parse_args():
+    from app.importer import BATCH_SIZE, TABLES
+
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command")
+
+    subparsers.add_parser("run", help="запуск сервера разработки (по умолчанию)")
+    subparsers.add_parser("migrate", help="приведение схемы БД к моделям")
+    subparsers.add_parser("seed", help="миграции и загрузка данных из app/data.py")
+
+    import_parser = subparsers.add_parser("import", help="миграции и загрузка данных из файла")
+    import_parser.add_argument("path", help="файл json, ndjson или csv")
+    import_parser.add_argument("--format", choices=["json", "ndjson", "csv"], help="формат файла (по умолчанию по расширению)")
+    import_parser.add_argument("--table", choices=list(TABLES), help="таблица для ndjson и csv")
+    import_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="размер пачки")
+
+    return parser.parse_args()
 
 
 if __name__ == '__main__':
-    app_config = Config()  # загрузка конфига
-    app = create_app(app_config)  # создание приложения
+    args = parse_args()
+    app = create_app(get_config())  # создание приложения (профиль из APP_ENV, APP_ENV=development - с DEBUG)
+
+    if args.command in ("migrate", "seed", "import"):
+        with app.app_context():
+            result = migrate()
+            if args.command == "seed":
+                result.update(create_data())
+            elif args.command == "import":
+                from app.importer import import_file
 
-    configure_app(app)  # конфигурирование приложения
-    create_data()  # загрузка данных и создание БД
-    app.run()  # запуск приложения
+                result.update(import_file(args.path, args.format, args.table, args.batch_size))
+        replica_router.sync(app)  # копии SQLite для реплик
+        print(json.dumps(result))
+    else:
+        app.run()  # запуск приложения
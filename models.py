@@ -1,15 +1,27 @@
+from datetime import datetime
+
 from marshmallow import Schema, fields
 
 from app.database import db
+from app.instrumentation import track
+
+
+class TimedSchema(Schema):
+    """
+    схема, время сериализации которой учитывается в метриках запроса
+    """
+    def dump(self, obj, *, many=None):
+        with track("serialize"):
+            return super().dump(obj, many=many)
 
 
 class Director(db.Model):
     __tablename__ = 'director'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(255))
+    name = db.Column(db.String(255), unique=True, index=True)
 
 
-class DirectorSchema(Schema):
+class DirectorSchema(TimedSchema):
     id = fields.Int()
     name = fields.Str()
 
@@ -21,10 +33,10 @@ directors_schema = DirectorSchema(many=True)
 class Genre(db.Model):
     __tablename__ = 'genre'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(255))
+    name = db.Column(db.String(255), unique=True, index=True)
 
 
-class GenreSchema(Schema):
+class GenreSchema(TimedSchema):
     id = fields.Int()
     name = fields.Str()
 
@@ -35,19 +47,35 @@ genres_schema = GenreSchema(many=True)
 
 class Movie(db.Model):
     __tablename__ = 'movie'
+    __table_args__ = (
+        # постраничная выборка фильмов жанра/режиссера: WHERE genre_id = ? AND id > ? ORDER BY id
+        db.Index("ix_movie_genre_id_id", "genre_id", "id"),
+        db.Index("ix_movie_director_id_id", "director_id", "id"),
+        # сортировка с keyset-курсором: ORDER BY <поле>, id
+        db.Index("ix_movie_rating_id", "rating", "id"),
+        db.Index("ix_movie_year_id", "year", "id"),
+        db.Index("ix_movie_title_id", "title", "id"),
+        # лучшие фильмы жанра: WHERE genre_id = ? ORDER BY rating DESC, id DESC
+        db.Index("ix_movie_genre_id_rating_id", "genre_id", "rating", "id"),
+        # выгрузка изменений: WHERE updated_at >= ? ORDER BY id
+        db.Index("ix_movie_updated_at", "updated_at"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255))
     description = db.Column(db.String(255))
     trailer = db.Column(db.String(255))
     year = db.Column(db.Integer)
     rating = db.Column(db.Float)
-    genre_id = db.Column(db.Integer, db.ForeignKey("genre.id"))
-    genre = db.relationship("Genre")
-    director_id = db.Column(db.Integer, db.ForeignKey("director.id"))
-    director = db.relationship("Director")
+    # удаление жанра или режиссера - см. app/integrity.py, смена id переносится на фильмы
+    genre_id = db.Column(db.Integer, db.ForeignKey("genre.id", onupdate="CASCADE"))
+    genre = db.relationship("Genre", lazy="joined")
+    director_id = db.Column(db.Integer, db.ForeignKey("director.id", onupdate="CASCADE"))
+    director = db.relationship("Director", lazy="joined")
+    # время последнего изменения (UTC), ставится при вставке и изменении строки
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
-class MovieSchema(Schema):
+class MovieSchema(TimedSchema):
     id = fields.Int()
     title = fields.Str()
     description = fields.Str()
@@ -56,3 +84,79 @@ class MovieSchema(Schema):
     rating = fields.Float()
     genre = fields.Pluck(GenreSchema, "name")
     director = fields.Pluck(DirectorSchema, "name")
+
+
+class GenreStats(db.Model):
+    """
+    сводка по фильмам жанра, пересчитывается при изменении фильмов жанра
+    """
+    __tablename__ = 'genre_stats'
+    genre_id = db.Column(db.Integer, primary_key=True)
+    movie_count = db.Column(db.Integer, nullable=False, default=0)
+    avg_rating = db.Column(db.Float)
+    max_rating = db.Column(db.Float)
+
+
+class GenreStatsSchema(TimedSchema):
+    genre_id = fields.Int()
+    name = fields.Str()
+    movie_count = fields.Int()
+    avg_rating = fields.Float()
+    max_rating = fields.Float()
+
+
+class DirectorStats(db.Model):
+    """
+    сводка по фильмам режиссера, пересчитывается при изменении фильмов режиссера
+    """
+    __tablename__ = 'director_stats'
+    director_id = db.Column(db.Integer, primary_key=True)
+    movie_count = db.Column(db.Integer, nullable=False, default=0)
+    avg_rating = db.Column(db.Float)
+    max_rating = db.Column(db.Float)
+
+
+class DirectorStatsSchema(TimedSchema):
+    director_id = fields.Int()
+    name = fields.Str()
+    movie_count = fields.Int()
+    avg_rating = fields.Float()
+    max_rating = fields.Float()
+
+
+class MovieView(db.Model):
+    """
+    денормализованная строка фильма для чтения: поля MovieSchema, названия жанра
+    и режиссера хранятся в строке; обновляется вместе с фильмами, жанрами
+    и режиссерами (app/read_model.py)
+    """
+    __tablename__ = 'movie_view'
+    __table_args__ = (
+        # те же выборки, что и по movie, но без JOIN
+        db.Index("ix_movie_view_genre_id_id", "genre_id", "id"),
+        db.Index("ix_movie_view_director_id_id", "director_id", "id"),
+        db.Index("ix_movie_view_rating_id", "rating", "id"),
+        db.Index("ix_movie_view_year_id", "year", "id"),
+        db.Index("ix_movie_view_title_id", "title", "id"),
+        db.Index("ix_movie_view_genre_id_rating_id", "genre_id", "rating", "id"),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    title = db.Column(db.String(255))
+    description = db.Column(db.String(255))
+    trailer = db.Column(db.String(255))
+    year = db.Column(db.Integer)
+    rating = db.Column(db.Float)
+    genre_id = db.Column(db.Integer)
+    genre = db.Column(db.String(255))
+    director_id = db.Column(db.Integer)
+    director = db.Column(db.String(255))
+
+
+class CatalogueVersion(db.Model):
+    """
+    номер версии справочников (одна строка), увеличивается при каждой записи
+    в жанры и режиссеров; по нему процессы обновляют снимок справочников (app/snapshot.py)
+    """
+    __tablename__ = 'catalogue_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,104 @@
+"""
+общие фикстуры: приложение с профилем testing и данными из app/data.py,
+счетчик SQL-запросов
+
+по умолчанию каждый тест работает с отдельной SQLite-базой во временном каталоге;
+TEST_DATABASE_URL=postgresql://... запускает тесты на PostgreSQL - например,
+на локальном сервере, поднятом через initdb/pg_ctl без контейнера (таблицы перед
+каждым тестом пересоздаются); тесты с меткой sqlite на других СУБД пропускаются
+"""
+import os
+
+import pytest
+from sqlalchemy import MetaData, event
+from sqlalchemy.engine import make_url
+
+from app.config import get_config
+from app.database import db
+from main import create_app, create_data, migrate
+from utils import invalidate_name_index
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+
+def database_backend():
+    return make_url(TEST_DATABASE_URL).get_backend_name() if TEST_DATABASE_URL else "sqlite"
+
+
+def pytest_collection_modifyitems(config, items):
+    if database_backend() == "sqlite":
+        return
+    skip = pytest.mark.skip(reason="только для SQLite")
+    for item in items:
+        if "sqlite" in item.keywords:
+            item.add_marker(skip)
+
+
+def _drop_tables(application):
+    with application.app_context():
+        engine = db.get_engine(application)
+        metadata = MetaData()
+        metadata.reflect(bind=engine)
+        metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def config_overrides():
+    """
+    настройки профиля testing, которые модуль тестов может переопределить
+    """
+    return {}
+
+
+@pytest.fixture
+def app(tmp_path, config_overrides):
+    config = get_config("testing")
+    if TEST_DATABASE_URL is None:
+        config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'movies.db'}"
+    for name, value in config_overrides.items():
+        setattr(config, name, value)
+
+    application = create_app(config)
+    invalidate_name_index()  # индекс имен - общий для процесса, а база у каждого теста своя
+    if TEST_DATABASE_URL is not None:
+        _drop_tables(application)
+    with application.app_context():
+        migrate()
+        create_data()
+        db.session.remove()
+    yield application
+
+    with application.app_context():
+        db.get_engine(application).dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class StatementCounter:
+    def __init__(self):
+        self.statements = []
+        self.parameters = []
+
+    def __call__(self, connection, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+        self.parameters.append(parameters)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@pytest.fixture
+def statements(app):
+    """
+    SQL-запросы к БД приложения, выполненные во время теста
+    """
+    counter = StatementCounter()
+    with app.app_context():
+        engine = db.get_engine(app)
+    event.listen(engine, "before_cursor_execute", counter)
+    yield counter
+    event.remove(engine, "before_cursor_execute", counter)
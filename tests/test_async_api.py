@@ -0,0 +1,67 @@
+"""
+асинхронный режим (ASGI) отдает те же ответы, что и Flask-приложение
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from app.async_api import AsyncApi  # noqa: E402
+
+URLS = [
+    "/movies/",
+    "/movies/?genre_id=4,17&sort=rating&order=desc&limit=3",
+    "/movies/?genre_id=abc",
+    "/movies/1?fields=title,genre",
+    "/genres/4",
+    "/directors/stats",
+    "/movies/export",
+    "/movies/export?format=csv",
+    "/movies/export?updated_since=2000-01-01T00:00:00Z",
+    "/movies/export?format=xml",
+    "/movies/export?updated_since=yesterday",
+]
+
+
+def asgi_get(api, url):
+    path, _, query = url.partition("?")
+    response = {"body": b""}
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {name.decode(): value.decode() for name, value in message["headers"]}
+        else:
+            response["body"] += message.get("body", b"")
+
+    async def call():
+        try:
+            await api({"type": "http", "method": "GET", "path": path, "query_string": query.encode()}, receive, send)
+        finally:
+            await api.engine.dispose()
+
+    asyncio.run(call())
+    return response
+
+
+@pytest.mark.parametrize("url", URLS)
+def test_same_response_as_wsgi(app, client, url):
+    api = AsyncApi(app)
+    expected = client.get(url)
+    response = asgi_get(api, url)
+
+    assert response["status"] == expected.status_code
+    assert response["headers"]["content-type"] == expected.content_type
+    assert response["body"] == expected.get_data()
+
+
+def test_export_headers(app):
+    response = asgi_get(AsyncApi(app), "/movies/export?format=csv")
+
+    assert response["headers"]["content-disposition"] == "attachment; filename=movies.csv"
+    assert "x-export-started-at" in response["headers"]
+    assert response["body"].startswith(b"id,title,")
@@ -0,0 +1,91 @@
+"""
+кэш ответов: запись во время GET-запроса не оставляет в кэше старый ответ
+"""
+import pytest
+from flask import Flask, jsonify
+
+from app.cache import ResponseCache
+
+
+@pytest.fixture
+def cache(app):
+    app.config.update(RESPONSE_CACHE_SIZE=16, RESPONSE_CACHE_TTL=60)
+    cache = ResponseCache()
+    cache.init_app(app)
+    return cache
+
+
+def test_response_of_get_overlapping_write_is_not_cached(app, cache):
+    titles = {1: "old"}
+
+    @cache.cached
+    def write():
+        titles[1] = "new"
+        return jsonify(titles[1])
+
+    @cache.cached
+    def read():
+        title = titles[1]  # GET прочитал данные до записи...
+        with app.test_request_context("/movies/1", method="PUT"):
+            write()  # ...а запись зафиксировалась и очистила кэш до конца GET
+        return jsonify(title)
+
+    with app.test_request_context("/movies/1"):
+        assert read().json == "old"
+
+    @cache.cached
+    def fresh_read():
+        return jsonify(titles[1])
+
+    with app.test_request_context("/movies/1"):
+        assert fresh_read().json == "new"
+
+
+def test_get_response_is_cached_between_writes(app, cache):
+    calls = []
+
+    @cache.cached
+    def read():
+        calls.append(1)
+        return jsonify(len(calls))
+
+    for _ in range(3):
+        with app.test_request_context("/movies/1"):
+            assert read().json == 1
+    assert len(calls) == 1
+
+
+def test_head_is_served_from_get_entry_and_does_not_clear_cache(app, cache):
+    calls = []
+
+    @cache.cached
+    def read():
+        calls.append(1)
+        return jsonify(len(calls))
+
+    with app.test_request_context("/movies/1"):
+        assert read().json == 1
+    with app.test_request_context("/movies/1", method="HEAD"):
+        assert read().status_code == 200
+    with app.test_request_context("/movies/1"):
+        assert read().json == 1
+    assert len(calls) == 1
+
+
+def test_each_app_has_its_own_cache(app, cache):
+    other = Flask(__name__)
+    other.config.update(RESPONSE_CACHE_SIZE=16)
+    cache.init_app(other)
+    calls = []
+
+    @cache.cached
+    def read():
+        calls.append(1)
+        return jsonify(len(calls))
+
+    with app.test_request_context("/movies/1"):
+        assert read().json == 1
+    with other.test_request_context("/movies/1"):
+        assert read().json == 2
+    with app.test_request_context("/movies/1"):
+        assert read().json == 1
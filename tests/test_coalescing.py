@@ -0,0 +1,148 @@
+"""
+объединение одинаковых одновременных GET-запросов (single-flight)
+"""
+import threading
+
+import pytest
+from flask import jsonify
+
+from app.coalescing import RequestCoalescer
+
+FOLLOWERS = 4
+TIMEOUT = 5
+
+
+@pytest.fixture
+def coalescer(app):
+    app.config.update(COALESCE_NAMESPACES=["movies"], COALESCE_TIMEOUT=TIMEOUT)
+    coalescer = RequestCoalescer()
+    coalescer.init_app(app)
+    return coalescer
+
+
+def run(app, function, path="/movies/", method="GET"):
+    with app.test_request_context(path, method=method):
+        return function()
+
+
+def followers_barrier(state, followers):
+    """
+    барьер, который ведомые запросы проходят, присоединившись к вычислению
+    """
+    joined = threading.Barrier(followers + 1, timeout=TIMEOUT)
+    join = state.join
+
+    def join_and_wait(key):
+        flight, leader = join(key)
+        if not leader:
+            joined.wait()
+        return flight, leader
+
+    state.join = join_and_wait
+    return joined
+
+
+def test_identical_requests_share_one_view_call(app, coalescer):
+    entered, release = threading.Event(), threading.Event()
+    joined = followers_barrier(app.extensions["request_coalescer"], FOLLOWERS)
+    calls = []
+
+    @coalescer.coalesced("movies")
+    def read():
+        calls.append(1)
+        entered.set()
+        assert release.wait(TIMEOUT)
+        return jsonify(len(calls))
+
+    results = []
+
+    def request():
+        results.append(run(app, read).get_json())
+
+    leader = threading.Thread(target=request)
+    leader.start()
+    assert entered.wait(TIMEOUT)
+    followers = [threading.Thread(target=request) for _ in range(FOLLOWERS)]
+    for thread in followers:
+        thread.start()
+    joined.wait()
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(TIMEOUT)
+
+    assert len(calls) == 1
+    assert results == [1] * (FOLLOWERS + 1)
+
+
+def test_leader_error_is_raised_in_followers(app, coalescer):
+    entered, release = threading.Event(), threading.Event()
+    joined = followers_barrier(app.extensions["request_coalescer"], 1)
+
+    @coalescer.coalesced("movies")
+    def read():
+        entered.set()
+        assert release.wait(TIMEOUT)
+        raise RuntimeError("ошибка ведущего")
+
+    errors = []
+
+    def request():
+        try:
+            run(app, read)
+        except RuntimeError as error:
+            errors.append(str(error))
+
+    threads = [threading.Thread(target=request)]
+    threads[0].start()
+    assert entered.wait(TIMEOUT)
+    threads.append(threading.Thread(target=request))
+    threads[1].start()
+    joined.wait()
+    release.set()
+    for thread in threads:
+        thread.join(TIMEOUT)
+
+    assert errors == ["ошибка ведущего"] * 2
+
+
+@pytest.mark.parametrize("method, written", [("POST", True), ("DELETE", True), ("HEAD", False), ("OPTIONS", False)])
+def test_only_writes_start_new_generation(app, coalescer, method, written):
+    state = app.extensions["request_coalescer"]
+
+    @coalescer.coalesced("movies")
+    def view():
+        return jsonify("ok")
+
+    generation = state.generation
+    assert run(app, view, method=method).status_code == 200
+    assert state.generation == generation + written
+
+
+def test_request_after_write_does_not_join_earlier_flight(app, coalescer):
+    entered, release = threading.Event(), threading.Event()
+    titles = ["old"]
+
+    @coalescer.coalesced("movies")
+    def read():
+        title = titles[0]
+        if title == "old":
+            entered.set()
+            assert release.wait(TIMEOUT)
+        return jsonify(title)
+
+    @coalescer.coalesced("movies")
+    def write():
+        titles[0] = "new"
+        return jsonify("ok")
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(run(app, read).get_json()))
+    leader.start()
+    assert entered.wait(TIMEOUT)
+    run(app, write, method="PUT")
+
+    # запрос после записи выполняет view сам, а не ждет ведущего
+    assert run(app, read).get_json() == "new"
+    release.set()
+    leader.join(TIMEOUT)
+    assert results == ["old"]
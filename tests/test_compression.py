@@ -0,0 +1,85 @@
+"""
+сжатие ответов по Accept-Encoding и проекция полей fields=
+"""
+import gzip
+
+import pytest
+
+from app.compression import CompressionSettings
+
+
+@pytest.fixture
+def config_overrides():
+    return {"COMPRESSION": True, "COMPRESSION_MIN_SIZE": 100, "RESPONSE_CACHE_SIZE": 16}
+
+
+def test_gzip_is_negotiated(client):
+    plain = client.get("/movies/?limit=5")
+    response = client.get("/movies/?limit=5", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert gzip.decompress(response.data) == plain.data
+    assert response.headers["ETag"].startswith("W/")
+
+
+def test_brotli_is_preferred_by_weight(client):
+    brotli = pytest.importorskip("brotli")
+    plain = client.get("/movies/?limit=5")
+
+    response = client.get("/movies/?limit=5", headers={"Accept-Encoding": "gzip;q=0.5, br"})
+    assert response.headers["Content-Encoding"] == "br"
+    assert brotli.decompress(response.data) == plain.data
+
+    response = client.get("/movies/?limit=5", headers={"Accept-Encoding": "gzip, br;q=0.1"})
+    assert response.headers["Content-Encoding"] == "gzip"
+
+
+@pytest.mark.parametrize("accept", [None, "identity", "deflate"])
+def test_uncompressed_response_still_varies(client, accept):
+    headers = {"Accept-Encoding": accept} if accept else {}
+    response = client.get("/movies/?limit=5", headers=headers)
+
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.json
+
+
+def test_small_response_is_not_compressed(client):
+    response = client.get("/movies/1?fields=title", headers={"Accept-Encoding": "gzip"})
+
+    assert len(response.data) < 100
+    assert "Content-Encoding" not in response.headers
+    assert "Vary" not in response.headers
+
+
+def test_cached_response_is_compressed_once_per_encoding(client, monkeypatch):
+    calls = []
+    compress = CompressionSettings.compress
+
+    def counting_compress(self, body, encoding):
+        calls.append(encoding)
+        return compress(self, body, encoding)
+
+    monkeypatch.setattr(CompressionSettings, "compress", counting_compress)
+    bodies = [client.get("/movies/?limit=5", headers={"Accept-Encoding": "gzip"}).data for _ in range(3)]
+    client.get("/movies/?limit=5")
+
+    assert bodies[0] == bodies[1] == bodies[2]
+    assert calls == ["gzip"]
+
+
+def test_fields_projection(client):
+    movies = client.get("/movies/?fields=year,title&limit=3").json
+    assert [list(movie) for movie in movies] == [["title", "year"]] * 3
+
+    movie = client.get("/movies/1?fields=rating").json
+    assert movie == {"rating": client.get("/movies/1").json["rating"]}
+
+
+@pytest.mark.parametrize("url", ["/movies/?fields=title,budget", "/movies/1?fields=secret", "/movies/search?q=a&fields=x"])
+def test_unknown_fields_are_rejected(client, url):
+    response = client.get(url)
+
+    assert response.status_code == 400
+    assert "Неизвестные поля" in response.json
@@ -0,0 +1,54 @@
+"""
+параллельное добавление фильмов с новыми жанрами и режиссерами:
+все запросы успешны, записи справочников не дублируются
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, select
+
+from app.database import db
+from models import Director, Genre, Movie
+
+THREADS = 8
+MOVIES_PER_THREAD = 5
+
+
+def test_parallel_movie_posts_with_new_names(app):
+    with app.app_context():
+        movies_before = db.session.execute(select(func.count(Movie.id))).scalar()
+        db.session.remove()
+
+    def post_movies(thread):
+        client = app.test_client()
+        statuses = []
+        for number in range(MOVIES_PER_THREAD):
+            # потоки одновременно добавляют одни и те же новые имена
+            response = client.post("/movies/", json={
+                "title": f"Фильм {thread}-{number}",
+                "year": 2020,
+                "rating": 7.5,
+                "genre": f"Новый жанр {number}",
+                "director": f"Новый режиссер {(thread + number) % 3}",
+            })
+            statuses.append(response.status_code)
+        return statuses
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        statuses = [status for result in executor.map(post_movies, range(THREADS)) for status in result]
+
+    assert statuses == [201] * THREADS * MOVIES_PER_THREAD
+
+    with app.app_context():
+        for model in (Genre, Director):
+            names = db.session.execute(select(model.name)).scalars().all()
+            assert len(names) == len(set(names))
+        new_genres = db.session.execute(select(Genre.name).where(Genre.name.like("Новый жанр%"))).scalars().all()
+        assert sorted(new_genres) == [f"Новый жанр {number}" for number in range(MOVIES_PER_THREAD)]
+
+        movies = db.session.execute(select(func.count(Movie.id))).scalar()
+        assert movies == movies_before + THREADS * MOVIES_PER_THREAD
+        unresolved = db.session.execute(
+            select(func.count(Movie.id)).where(Movie.title.like("Фильм %-%"), Movie.genre_id.is_(None))
+        ).scalar()
+        assert unresolved == 0
+        db.session.remove()
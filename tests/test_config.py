@@ -0,0 +1,97 @@
+"""
+профили конфига, параметры подключения к БД, импорт точки входа
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+
+from app.config import ProductionConfig, get_config
+from app.database import async_engine_options, db, engine_options
+from main import create_app
+
+
+def test_default_profile_is_production(monkeypatch):
+    monkeypatch.delenv("APP_ENV", raising=False)
+
+    config = get_config()
+    assert isinstance(config, ProductionConfig)
+    assert config.DEBUG is False
+
+
+def test_development_profile_only_by_name(monkeypatch):
+    monkeypatch.setenv("APP_ENV", "development")
+    assert get_config().DEBUG is True
+
+
+def _config(url):
+    config = get_config("production")
+    config.SQLALCHEMY_DATABASE_URI = url
+    return {name: getattr(config, name) for name in dir(config) if name.isupper()}
+
+
+def test_postgres_engine_options():
+    options = engine_options(_config("postgresql://movies@localhost/movies"))
+
+    assert options["pool_size"] == 5
+    assert options["max_overflow"] == 10
+    assert options["pool_pre_ping"] is True
+    assert options["connect_args"] == {"options": "-c statement_timeout=5000"}
+
+
+def test_postgres_async_engine_options():
+    options = async_engine_options(_config("postgresql://movies@localhost/movies"))
+
+    assert options["pool_pre_ping"] is True
+    assert options["connect_args"] == {"server_settings": {"statement_timeout": "5000"}}
+
+
+@pytest.mark.sqlite
+def test_sqlite_pragmas(app):
+    with app.app_context():
+        with db.engine.connect() as connection:
+            assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert connection.execute(text("PRAGMA foreign_keys")).scalar() == 1
+            assert connection.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+
+
+def test_main_imports_models_lazily():
+    # модели (и все, что их импортирует) загружаются только в create_app
+    code = "import sys, main; print(sorted(name for name in ('models', 'app.serialization') if name in sys.modules))"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=Path(__file__).parents[1], capture_output=True, text=True, check=True,
+    ).stdout
+    assert output.strip() == "[]"
+
+
+def test_two_apps_keep_their_own_settings(app, tmp_path):
+    config = get_config("testing")
+    config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'other.db'}"
+    config.DATABASE_REPLICA_URLS = [f"sqlite:///{tmp_path / 'replica.db'}"]
+    config.RATE_LIMITS = {"movies": (1, 60)}
+    config.CATALOGUE_SNAPSHOT = True
+    other = create_app(config)
+
+    # вторая копия приложения не перенастраивает первую
+    assert app.extensions["replica_router"].engines == []
+    assert other.extensions["replica_router"].engines[0].url.database.endswith("replica.db")
+    assert app.extensions["rate_limiter"].limits == {}
+    assert other.extensions["rate_limiter"].limits == {"movies": (1, 60)}
+    assert app.extensions["catalogue_snapshot"].enabled is False
+    assert other.extensions["catalogue_snapshot"].enabled is True
+
+    client = app.test_client()
+    assert [client.get("/movies/1").status_code for _ in range(2)] == [200, 200]
+    with other.app_context():
+        db.get_engine(other).dispose()
+
+
+def test_unknown_delete_mode_fails_at_create_app():
+    config = get_config("testing")
+    config.DIRECTORY_DELETE_MODE = "setnull"
+
+    with pytest.raises(ValueError, match="DIRECTORY_DELETE_MODE"):
+        create_app(config)
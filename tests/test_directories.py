@@ -0,0 +1,153 @@
+"""
+запись жанров и режиссеров по одному: конфликты имен, удаление
+в режимах DIRECTORY_DELETE_MODE, перенос фильмов на другую запись
+"""
+import pytest
+from sqlalchemy import select
+
+from app.database import db
+from app.read_model import refresh_movie_view
+from app.stats import refresh_stats
+from models import DirectorStats, GenreStats, Movie, MovieView
+
+DIRECTORIES = {
+    "genres": ("Драма", "Комедия"),
+    "directors": ("Тейлор Шеридан", "Квентин Тарантино"),
+}
+
+
+@pytest.mark.parametrize("directory, names", DIRECTORIES.items())
+def test_post_duplicate_name_is_conflict(client, directory, names):
+    response = client.post(f"/{directory}/", json={"name": names[0]})
+
+    assert response.status_code == 409
+    assert response.json == "запись с таким name уже есть"
+
+
+@pytest.mark.parametrize("directory", DIRECTORIES)
+def test_post_existing_id_is_conflict(client, directory):
+    response = client.post(f"/{directory}/", json={"id": 1, "name": "Новое имя"})
+
+    assert response.status_code == 409
+    assert [item["name"] for item in client.get(f"/{directory}/").json].count("Новое имя") == 0
+
+
+@pytest.mark.parametrize("directory, names", DIRECTORIES.items())
+def test_put_name_of_another_record_is_conflict(client, directory, names):
+    items = {item["name"]: item["id"] for item in client.get(f"/{directory}/").json}
+    item_id = items[names[1]]
+
+    response = client.put(f"/{directory}/{item_id}", json={"id": item_id, "name": names[0]})
+    assert response.status_code == 409
+
+    # свое же имя - не конфликт
+    response = client.put(f"/{directory}/{item_id}", json={"id": item_id, "name": names[1]})
+    assert response.status_code == 200
+
+
+# справочник -> (колонка фильма, модель сводки, id записи с фильмами, id другой записи с фильмами)
+WITH_MOVIES = {
+    "genres": (Movie.genre_id, GenreStats, 4, 17),
+    "directors": (Movie.director_id, DirectorStats, 2, 1),
+}
+
+
+def read_model(app):
+    """
+    сводки и movie_view
+    """
+    with app.app_context():
+        rows = {
+            model: sorted(tuple(row) for row in db.session.execute(select(*model.__table__.columns)))
+            for model in (GenreStats, DirectorStats, MovieView)
+        }
+        db.session.remove()
+    return rows
+
+
+def rebuilt_read_model(app):
+    with app.app_context():
+        with db.session.begin():
+            refresh_stats()
+            refresh_movie_view()
+    return read_model(app)
+
+
+def movie_ids(app, column, item_id):
+    with app.app_context():
+        ids = db.session.execute(select(Movie.id).where(column == item_id)).scalars().all()
+        db.session.remove()
+    return ids
+
+
+@pytest.mark.parametrize("config_overrides", [{"DIRECTORY_DELETE_MODE": "restrict"}])
+@pytest.mark.parametrize("directory", WITH_MOVIES)
+def test_delete_restrict(app, client, directory, config_overrides):
+    column, stats_model, item_id, _ = WITH_MOVIES[directory]
+    before = read_model(app)
+
+    response = client.delete(f"/{directory}/{item_id}")
+
+    assert response.status_code == 409
+    assert client.get(f"/{directory}/{item_id}/stats").status_code == 200
+    assert read_model(app) == before
+
+
+@pytest.mark.parametrize("config_overrides", [{"DIRECTORY_DELETE_MODE": "set_null"}])
+@pytest.mark.parametrize("directory", WITH_MOVIES)
+def test_delete_set_null(app, client, directory, config_overrides):
+    column, stats_model, item_id, _ = WITH_MOVIES[directory]
+    movies = movie_ids(app, column, item_id)
+
+    assert client.delete(f"/{directory}/{item_id}").status_code == 204
+
+    assert movie_ids(app, column, item_id) == []
+    assert [client.get(f"/movies/{movie_id}").status_code for movie_id in movies] == [200] * len(movies)
+    after = read_model(app)
+    assert after == rebuilt_read_model(app)
+    assert all(row[0] != item_id for row in after[stats_model])
+
+
+@pytest.mark.parametrize("config_overrides", [{"DIRECTORY_DELETE_MODE": "cascade"}])
+@pytest.mark.parametrize("directory", WITH_MOVIES)
+def test_delete_cascade(app, client, directory, config_overrides):
+    column, stats_model, item_id, _ = WITH_MOVIES[directory]
+    movies = movie_ids(app, column, item_id)
+
+    assert client.delete(f"/{directory}/{item_id}").status_code == 204
+
+    assert [client.get(f"/movies/{movie_id}").status_code for movie_id in movies] == [404] * len(movies)
+    after = read_model(app)
+    assert after == rebuilt_read_model(app)
+    assert not {row[0] for row in after[MovieView]} & set(movies)
+
+
+@pytest.mark.parametrize("directory", WITH_MOVIES)
+def test_reassign_moves_movies_and_stats(app, client, directory):
+    column, stats_model, from_id, to_id = WITH_MOVIES[directory]
+    moved = movie_ids(app, column, from_id)
+    kept = movie_ids(app, column, to_id)
+
+    response = client.post(f"/{directory}/{from_id}/reassign", json={"to_id": to_id})
+
+    assert response.status_code == 200
+    assert response.json == {"from_id": from_id, "to_id": to_id, "movies": len(moved)}
+    assert movie_ids(app, column, from_id) == []
+    assert sorted(movie_ids(app, column, to_id)) == sorted(moved + kept)
+    assert read_model(app) == rebuilt_read_model(app)
+
+
+@pytest.mark.parametrize("directory", WITH_MOVIES)
+@pytest.mark.parametrize("body", [{}, {"to_id": "1"}, {"to_id": 1.5}, {"to_id": True}, [1], None])
+def test_reassign_rejects_bad_to_id(client, directory, body):
+    _, _, from_id, _ = WITH_MOVIES[directory]
+
+    assert client.post(f"/{directory}/{from_id}/reassign", json=body).status_code == 400
+
+
+@pytest.mark.parametrize("directory", WITH_MOVIES)
+def test_reassign_to_missing_record(client, directory):
+    _, _, from_id, _ = WITH_MOVIES[directory]
+
+    assert client.post(f"/{directory}/{from_id}/reassign", json={"to_id": 100000}).status_code == 404
+    assert client.post(f"/{directory}/100000/reassign", json={"to_id": from_id}).status_code == 404
@@ -0,0 +1,82 @@
+"""
+фильтры и курсоры списка фильмов: недопустимые значения не доходят до БД
+"""
+import base64
+import json
+
+import pytest
+
+from app.importer import import_data
+
+
+def cursor(value, movie_id):
+    return base64.urlsafe_b64encode(json.dumps([value, movie_id]).encode()).decode()
+
+
+@pytest.mark.parametrize("query", [
+    "genre_id=abc", "genre_id=1,x", "director_id=1.5", "year_from=abc", "year_to=2000x", "min_rating=high",
+])
+def test_invalid_filter_is_bad_request(client, query):
+    response = client.get(f"/movies/?{query}")
+
+    assert response.status_code == 400
+    assert query.partition("=")[0] in response.json
+
+
+def test_id_list_accepts_repeated_and_comma_separated_ids(client):
+    response = client.get("/movies/?genre_id=4,17&genre_id=18,&limit=100")
+    separate = [client.get(f"/movies/?genre_id={genre_id}&limit=100").json or [] for genre_id in (4, 17, 18)]
+
+    assert response.status_code == 200
+    assert sorted(movie["title"] for movie in response.json) == sorted(
+        movie["title"] for movies in separate for movie in movies
+    )
+
+
+@pytest.mark.parametrize("value, movie_id", [([1], 1), ({"a": 1}, 1), (True, 1), (8.0, [1]), (8.0, "1")])
+def test_malformed_cursor_is_ignored(client, value, movie_id):
+    first_page = client.get("/movies/?sort=rating&limit=3")
+    response = client.get(f"/movies/?sort=rating&limit=3&cursor={cursor(value, movie_id)}")
+
+    assert response.status_code == 200
+    assert response.json == first_page.json
+
+
+@pytest.fixture
+def movies_without_values(app):
+    # фильмы без названия, года и рейтинга
+    records = [
+        {"pk": pk, "title": None, "description": None, "trailer": None, "year": None, "rating": None,
+         "genre_id": 4, "director_id": 2}
+        for pk in (101, 102)
+    ]
+    with app.app_context():
+        import_data({"movies": records})
+
+
+@pytest.mark.parametrize("sort", ["rating", "year", "title"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_cursor_pages_include_movies_without_sort_value(client, movies_without_values, sort, order):
+    everything = client.get("/movies/?limit=100").json
+    movie_ids, url = [], f"/movies/?sort={sort}&order={order}&limit=3"
+    while True:
+        response = client.get(url)
+        movie_ids += [movie["id"] for movie in response.json or []]
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if next_cursor is None:
+            break
+        url = f"/movies/?sort={sort}&order={order}&limit=3&cursor={next_cursor}"
+
+    assert sorted(movie_ids) == sorted(movie["id"] for movie in everything)
+    # фильмы без значения поля - в конце при любом порядке (по id)
+    tail = [101, 102] if order == "asc" else [102, 101]
+    assert movie_ids[-2:] == tail
+
+
+def test_cursor_continues_sorted_list(client):
+    first_page = client.get("/movies/?sort=rating&order=desc&limit=3")
+    next_page = client.get(f"/movies/?sort=rating&order=desc&limit=3&cursor={first_page.headers['X-Next-Cursor']}")
+    whole = client.get("/movies/?sort=rating&order=desc&limit=6")
+
+    assert next_page.status_code == 200
+    assert first_page.json + next_page.json == whole.json
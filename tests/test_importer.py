@@ -0,0 +1,75 @@
+"""
+импорт: сводки и movie_view пересчитываются только для изменившихся записей
+"""
+import copy
+
+from sqlalchemy import select
+
+from app.data import data
+from app.database import db
+from app.importer import import_data
+from app.read_model import refresh_movie_view
+from app.stats import refresh_stats
+from models import DirectorStats, GenreStats, MovieView
+
+
+def snapshot(app):
+    with app.app_context():
+        return {
+            model: sorted(tuple(row) for row in db.session.execute(select(*model.__table__.columns)))
+            for model in (GenreStats, DirectorStats, MovieView)
+        }
+
+
+def rebuilt(app):
+    """
+    сводки и movie_view, пересобранные целиком
+    """
+    with app.app_context():
+        with db.session.begin():
+            refresh_stats()
+            refresh_movie_view()
+    return snapshot(app)
+
+
+def read_model_writes(statements):
+    return [
+        statement for statement in statements.statements
+        if any(table in statement for table in ("movie_view", "genre_stats", "director_stats"))
+    ]
+
+
+def test_reimport_of_same_data_does_not_refresh(app, statements):
+    with app.app_context():
+        report = import_data(data)
+
+    assert all(table["changed"] == 0 for table in report["tables"].values())
+    assert read_model_writes(statements) == []
+
+
+def test_partial_import_refreshes_changed_movie_and_groups(app, statements):
+    movie = dict(copy.deepcopy(data["movies"][0]), rating=1.5, genre_id=4, director_id=2)
+
+    with app.app_context():
+        report = import_data({"movies": [movie]})
+    assert report["tables"]["movies"]["changed"] == 1
+
+    # пересчет по id, а не целиком
+    writes = read_model_writes(statements)
+    assert writes and all("WHERE" in statement or "IN (" in statement for statement in writes)
+
+    after = snapshot(app)
+    assert after == rebuilt(app)
+    view = {row[0]: row for row in after[MovieView]}
+    assert 1.5 in view[movie["pk"]]
+
+
+def test_renamed_genre_is_refreshed_in_movie_view(app, client):
+    genre = {"pk": 17, "name": "Переименованный жанр"}
+
+    with app.app_context():
+        import_data({"genres": [genre]})
+
+    assert snapshot(app) == rebuilt(app)
+    movies = client.get(f"/movies/?genre_id={genre['pk']}").json
+    assert movies and all(item["genre"] == "Переименованный жанр" for item in movies)
@@ -0,0 +1,52 @@
+"""
+инструментирование: заголовок Server-Timing, /metrics и лог медленных запросов
+"""
+import logging
+import re
+
+import pytest
+
+
+@pytest.fixture
+def config_overrides():
+    return {"INSTRUMENTATION": True, "SLOW_QUERY_MS": 0}
+
+
+def test_server_timing_header(client):
+    response = client.get("/movies/1")
+
+    timing = response.headers["Server-Timing"]
+    assert re.fullmatch(
+        r'db;dur=[\d.]+;desc="[1-9]\d* queries", serialize;dur=[\d.]+, total;dur=[\d.]+', timing
+    ), timing
+
+
+def metric(client, name, status):
+    labels = f'route="/movies/<int:mid>",method="GET",status="{status}"'
+    lines = client.get("/metrics").get_data(as_text=True).splitlines()
+    return next((float(line.rsplit(" ", 1)[1]) for line in lines if line.startswith(f"{name}{{{labels}}}")), 0)
+
+
+def test_metrics_are_accumulated_by_route(client):
+    before = {status: metric(client, "http_requests_total", status) for status in (200, 404)}
+    queries_before = metric(client, "db_queries_total", 200)
+    for _ in range(2):
+        client.get("/movies/1")
+    client.get("/movies/100000")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    assert "# TYPE http_requests_total counter" in response.get_data(as_text=True).splitlines()
+    assert metric(client, "http_requests_total", 200) == before[200] + 2
+    assert metric(client, "http_requests_total", 404) == before[404] + 1
+    assert metric(client, "db_queries_total", 200) >= queries_before + 2
+
+
+def test_slow_query_log_has_statement_without_parameters(client, caplog):
+    with caplog.at_level(logging.WARNING, logger="app.sql"):
+        client.get("/movies/search?q=секретноеслово")
+
+    messages = [record.getMessage() for record in caplog.records if record.name == "app.sql"]
+    assert messages and any("movie_fts" in message for message in messages)
+    assert not any("секретноеслово" in message for message in messages)
@@ -0,0 +1,77 @@
+"""
+миграции существующей базы
+"""
+import pytest
+from sqlalchemy import func, select
+
+from app.database import db
+from app.migrations import add_movie_search_index, run_migrations, schema_version
+from models import Genre, GenreStats, Movie, MovieView
+
+# таблица movie до миграции 8: без внешних ключей
+MOVIE_V7 = (
+    "CREATE TABLE movie (id INTEGER NOT NULL PRIMARY KEY, title VARCHAR(255), description VARCHAR(255), "
+    "trailer VARCHAR(255), year INTEGER, rating FLOAT, genre_id INTEGER, director_id INTEGER, updated_at DATETIME)"
+)
+
+
+def test_duplicate_names_are_merged_before_unique_index(app, client):
+    with app.app_context():
+        with db.engine.begin() as connection:
+            # база до миграции 1: без уникального индекса, с повторяющимся названием
+            connection.exec_driver_sql("DROP INDEX ix_genre_name")
+            connection.execute(Genre.__table__.insert().values(id=100, name="Драма"))
+            connection.execute(Movie.__table__.update().where(Movie.id == 1).values(genre_id=100))
+            connection.execute(schema_version.update().values(version=0))
+            keep_id = connection.execute(select(Genre.id).where(Genre.name == "Драма", Genre.id != 100)).scalar()
+
+        run_migrations()
+
+        assert db.session.execute(select(func.count()).where(Genre.name == "Драма")).scalar() == 1
+        assert db.session.get(Movie, 1).genre_id == keep_id
+        assert db.session.get(MovieView, 1).genre_id == keep_id
+        assert db.session.get(GenreStats, 100) is None
+        assert "ix_genre_name" in {index["name"] for index in db.inspect(db.engine).get_indexes("genre")}
+
+    assert client.post("/genres/", json={"name": "Драма"}).status_code == 409
+
+
+@pytest.mark.sqlite
+def test_version_7_database_is_upgraded_with_foreign_keys(app, client):
+    with app.app_context():
+        with db.engine.connect() as connection:
+            movies_before = connection.execute(select(func.count()).select_from(Movie)).scalar()
+            connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            with connection.begin():
+                connection.exec_driver_sql("ALTER TABLE movie RENAME TO movie_current")
+                connection.exec_driver_sql(MOVIE_V7)
+                connection.exec_driver_sql("INSERT INTO movie SELECT * FROM movie_current")
+                connection.exec_driver_sql("DROP TABLE movie_current")
+                add_movie_search_index(connection)
+                # ссылка на удаленный жанр
+                connection.execute(Movie.__table__.update().where(Movie.id == 1).values(genre_id=999))
+                connection.execute(
+                    MovieView.__table__.update().where(MovieView.id == 1).values(genre_id=999, genre="Удаленный жанр")
+                )
+                connection.execute(schema_version.update().values(version=7))
+            connection.exec_driver_sql("PRAGMA foreign_keys=ON")
+            connection.invalidate()  # соединение в пул не возвращается
+
+        assert db.inspect(db.engine).get_foreign_keys("movie") == []
+        assert run_migrations() >= 8
+
+        inspector = db.inspect(db.engine)
+        keys = {key["referred_table"]: key for key in inspector.get_foreign_keys("movie")}
+        assert keys["genre"]["options"] == {"onupdate": "CASCADE"}
+        assert keys["director"]["options"] == {"onupdate": "CASCADE"}
+        assert "ix_movie_genre_id_id" in {index["name"] for index in inspector.get_indexes("movie")}
+        assert db.session.execute(select(func.count()).select_from(Movie)).scalar() == movies_before
+        assert db.session.get(Movie, 1).genre_id is None
+        assert db.session.get(MovieView, 1).genre is None
+        db.session.remove()
+
+    # триггеры полнотекстового индекса пересозданы вместе с таблицей
+    movie = dict(client.get("/movies/1").json, id=1, title="Переименованный фильм")
+    assert client.put("/movies/1", json=movie).status_code == 200
+    found = client.get("/movies/search", query_string={"q": "переименованный", "fields": "id"}).json
+    assert found == [{"id": 1}]
@@ -0,0 +1,50 @@
+"""
+индекс имен справочников: id, выданные незафиксированной транзакцией,
+не видны другим запросам до фиксации
+"""
+from sqlalchemy import select
+
+from app.database import db
+from models import Genre
+from utils import _name_index, set_genre_id
+
+
+def test_added_name_is_shared_only_after_commit(app):
+    with app.app_context():
+        with db.session.begin():
+            genre_id = set_genre_id("Новый жанр")
+            assert set_genre_id("Новый жанр") == genre_id  # в своей транзакции id уже известен
+            assert "Новый жанр" not in _name_index.names[Genre]
+
+        assert _name_index.names[Genre]["Новый жанр"] == genre_id
+
+        # индекс сверен с версией, которую дала сама транзакция: новая транзакция его не сбрасывает
+        with db.session.begin():
+            assert set_genre_id("Новый жанр") == genre_id
+            assert _name_index.names[Genre]
+        db.session.remove()
+
+
+def test_rolled_back_name_is_forgotten(app):
+    with app.app_context():
+        db.session.begin()
+        rolled_back_id = set_genre_id("Откаченный жанр")
+        db.session.rollback()
+        assert "Откаченный жанр" not in _name_index.names[Genre]
+
+        with db.session.begin():
+            genre_id = set_genre_id("Откаченный жанр")
+        with db.session.begin():
+            stored = db.session.execute(select(Genre.id).where(Genre.name == "Откаченный жанр")).scalar()
+        assert stored == genre_id
+        assert rolled_back_id is not None
+        db.session.remove()
+
+
+def test_committed_names_are_indexed_directly(app):
+    with app.app_context():
+        db.session.begin()
+        genre_id = set_genre_id("Драма")
+        assert _name_index.names[Genre]["Драма"] == genre_id
+        db.session.rollback()
+        db.session.remove()
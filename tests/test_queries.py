@@ -0,0 +1,32 @@
+"""
+число SQL-запросов на запрос к API: фильмы читаются вместе с жанром и режиссером
+"""
+import pytest
+
+
+@pytest.mark.parametrize("url", ["/movies/", "/movies/?page=2", "/genres/4", "/directors/2", "/movies/?sort=rating"])
+def test_movie_page_costs_one_or_two_statements(client, statements, url):
+    response = client.get(url)
+
+    assert response.status_code == 200
+    assert 0 < len(response.json) <= 5
+    assert all(movie["genre"] and movie["director"] for movie in response.json)
+    assert 1 <= statements.count <= 2, statements.statements
+
+
+def test_single_movie_is_one_statement(client, statements):
+    response = client.get("/movies/1")
+
+    assert response.status_code == 200
+    assert response.json["genre"] and response.json["director"]
+    assert statements.count == 1, statements.statements
+
+
+def test_movie_page_without_fast_serialization(app, client, statements):
+    # путь через MovieSchema.dump (объекты Movie) тоже не догружает связи по одной
+    app.config["FAST_SERIALIZATION"] = False
+    response = client.get("/movies/")
+
+    assert response.status_code == 200
+    assert len(response.json) == 5
+    assert 1 <= statements.count <= 2, statements.statements
@@ -0,0 +1,54 @@
+"""
+планы запросов списков фильмов: фильтры и сортировки читаются по индексам
+(ix_movie_view_* - в быстром режиме, ix_movie_* - через модель Movie)
+"""
+import pytest
+
+from app.database import db
+
+pytestmark = pytest.mark.sqlite
+
+# запрос -> индекс (без префикса таблицы), по которому он должен читаться
+INDEXED_READS = {
+    "/movies/?genre_id=4": "genre_id_id",
+    "/movies/?director_id=2": "director_id_id",
+    "/movies/?genre_id=4&after_id=3": "genre_id_id",
+    "/movies/?genre_id=4&sort=rating&order=desc": "genre_id_rating_id",
+    "/movies/?sort=rating": "rating_id",
+    "/movies/?sort=year&order=desc": "year_id",
+    "/movies/?sort=title": "title_id",
+    "/movies/?year_from=2000&sort=year": "year_id",
+    "/movies/?min_rating=8&sort=rating": "rating_id",
+    "/genres/4": "genre_id_id",
+    "/directors/2?sort=rating": "director_id_id",
+}
+
+# фильмы режиссера сортируются после чтения по индексу (индекса с rating нет)
+SORTED_AFTER_READ = {"/directors/2?sort=rating"}
+
+
+def query_plan(app, statement, parameters):
+    with app.app_context():
+        with db.engine.connect() as connection:
+            rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    return [row[-1] for row in rows]
+
+
+@pytest.mark.parametrize("table, fast", [("movie_view", True), ("movie", False)])
+@pytest.mark.parametrize("url, index", INDEXED_READS.items())
+def test_movie_list_reads_by_index(app, client, statements, url, index, table, fast):
+    app.config["FAST_SERIALIZATION"] = fast
+    response = client.get(url)
+    assert response.status_code == 200
+
+    statement, parameters = next(
+        (statement, parameters)
+        for statement, parameters in zip(statements.statements, statements.parameters)
+        if statement.lstrip().upper().startswith("SELECT") and f"FROM {table}" in statement
+    )
+    plan = query_plan(app, statement, parameters)
+
+    # SCAN по индексу - сортировка без фильтра (NULLS LAST) читается в порядке индекса
+    assert f"{table} USING INDEX ix_{table}_{index}" in plan[0], plan
+    if url not in SORTED_AFTER_READ:
+        assert not any("TEMP B-TREE" in row for row in plan), plan
@@ -0,0 +1,71 @@
+"""
+ограничение частоты запросов: token bucket с управляемыми часами
+"""
+import pytest
+
+from app.ratelimit import MemoryBackend
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def config_overrides():
+    # 2 запроса за 10 секунд: токен появляется раз в 5 секунд
+    return {"RATE_LIMITS": {"movies": (2, 10)}}
+
+
+@pytest.fixture
+def clock(app):
+    clock = Clock()
+    app.extensions["rate_limiter"].backend = MemoryBackend(clock=clock)
+    return clock
+
+
+def get(client, url="/movies/1", address="10.0.0.1"):
+    return client.get(url, environ_base={"REMOTE_ADDR": address})
+
+
+def test_empty_bucket_returns_429_with_retry_after(client, clock):
+    assert [get(client).status_code for _ in range(2)] == [200, 200]
+
+    response = get(client)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "5"
+
+    clock.now += 2.5
+    response = get(client)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"  # 2.5 секунды округляются вверх
+
+
+def test_bucket_refills_over_time(client, clock):
+    for _ in range(2):
+        get(client)
+    assert get(client).status_code == 429
+
+    clock.now += 5
+    assert get(client).status_code == 200
+    assert get(client).status_code == 429
+
+    # ведро не наполняется больше емкости
+    clock.now += 60
+    assert [get(client).status_code for _ in range(3)] == [200, 200, 429]
+
+
+def test_buckets_are_per_client_and_route(client, clock):
+    for _ in range(2):
+        get(client)
+    assert get(client).status_code == 429
+
+    assert get(client, address="10.0.0.2").status_code == 200
+    assert get(client, url="/movies/?limit=1").status_code == 200
+
+
+def test_namespace_without_limit_is_not_limited(client, clock):
+    assert [client.get("/genres/1").status_code for _ in range(5)] == [200] * 5
@@ -0,0 +1,91 @@
+"""
+чтение с реплик SQLite: выбор реплики по кругу, пропуск недоступных,
+чтение своих записей с основной БД мимо кэша ответов
+"""
+import os
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.replicas import replica_router
+
+pytestmark = pytest.mark.sqlite
+
+NEW_GENRE = {"name": "Жанр после записи"}
+
+
+@pytest.fixture
+def config_overrides(tmp_path):
+    return {
+        "DATABASE_REPLICA_URLS": [f"sqlite:///{tmp_path / 'replica_1.db'}", f"sqlite:///{tmp_path / 'replica_2.db'}"],
+        "REPLICA_HEALTH_CHECK_INTERVAL": 0,
+        "SQLITE_REPLICA_SYNC": True,
+        "RESPONSE_CACHE_SIZE": 16,
+    }
+
+
+@pytest.fixture
+def databases(app):
+    """
+    файлы БД, к которым обращались во время теста
+    """
+    used = []
+
+    def listener(connection, cursor, statement, parameters, context, executemany):
+        used.append(os.path.basename(connection.engine.url.database))
+
+    replica_router.sync(app)
+    event.listen(Engine, "before_cursor_execute", listener)
+    yield used
+    event.remove(Engine, "before_cursor_execute", listener)
+
+
+def read(client, databases, url):
+    databases.clear()
+    response = client.get(url)
+    assert response.status_code == 200
+    return response, set(databases)
+
+
+def test_reads_go_to_replicas_in_turn(client, databases):
+    used = [read(client, databases, f"/movies/{movie_id}")[1] for movie_id in (1, 2, 3, 4)]
+
+    assert used == [{"replica_1.db"}, {"replica_2.db"}, {"replica_1.db"}, {"replica_2.db"}]
+
+
+def test_unavailable_replica_is_skipped(app, client, databases):
+    state = replica_router.state(app)
+    os.remove(state.engines[1].url.database)
+    state.engines[1].dispose()
+
+    used = [read(client, databases, f"/movies/{movie_id}")[1] for movie_id in (1, 2, 3)]
+
+    # к недоступной реплике обращается только проверка доступности
+    assert [names - {"replica_2.db"} for names in used] == [{"replica_1.db"}] * 3
+
+
+def test_writer_reads_from_primary_after_write(client, databases):
+    response = client.post("/genres/", json=NEW_GENRE)
+    assert response.status_code == 201
+    assert "db_primary_until=" in response.headers["Set-Cookie"]
+
+    response, used = read(client, databases, "/genres/")
+    assert used == {"movies.db"}
+    assert NEW_GENRE["name"] in [genre["name"] for genre in response.json]
+
+
+def test_writer_does_not_read_cached_replica_response(app, client, databases):
+    # реплики отстают: файл основной БД на них больше не копируется
+    app.config["SQLITE_REPLICA_SYNC"] = False
+    reader = app.test_client()
+
+    assert client.post("/genres/", json=NEW_GENRE).status_code == 201
+    # другой клиент читает с реплики, и ее ответ попадает в кэш
+    response, used = read(reader, databases, "/genres/")
+    assert used <= {"replica_1.db", "replica_2.db"}
+    assert NEW_GENRE["name"] not in [genre["name"] for genre in response.json]
+
+    response, used = read(client, databases, "/genres/")
+    assert used == {"movies.db"}
+    assert NEW_GENRE["name"] in [genre["name"] for genre in response.json]
@@ -0,0 +1,42 @@
+"""
+полнотекстовый поиск фильмов
+"""
+from unittest import mock
+
+import pytest
+
+from app.database import db
+
+MOVIE = {
+    "description": "описание",
+    "trailer": "https://example.com/trailer",
+    "year": 2021,
+    "rating": 7.0,
+    "genre": "Драма",
+    "director": "Тейлор Шеридан",
+}
+
+
+@pytest.fixture
+def titles(client):
+    for title in ("Search_movie", "SearchXmovie"):
+        assert client.post("/movies/", json=dict(MOVIE, title=title)).status_code == 201
+
+
+def search(client, query):
+    response = client.get("/movies/search", query_string={"q": query, "fields": "title"})
+    assert response.status_code == 200
+    return [movie["title"] for movie in response.json]
+
+
+@pytest.mark.sqlite
+def test_search_by_word_prefix(client):
+    assert "Йеллоустоун" in search(client, "йеллоу")
+
+
+def test_unindexed_search_escapes_like_wildcards(app, client, titles):
+    with app.app_context():
+        dialect = type(db.engine.dialect)
+    # СУБД без полнотекстового индекса: поиск подстроки через ILIKE
+    with mock.patch.object(dialect, "name", "unknown"):
+        assert search(client, "search_movie") == ["Search_movie"]
@@ -0,0 +1,85 @@
+"""
+запись фильмов: сводки и movie_view обновляются в той же транзакции
+"""
+from sqlalchemy import select
+
+from app.database import db
+from models import CatalogueVersion, Director, DirectorStats, Genre, GenreStats
+from utils import invalidate_name_index
+
+NEW_MOVIE = {
+    "title": "Новый фильм",
+    "description": "описание",
+    "trailer": "https://example.com/trailer",
+    "year": 2021,
+    "rating": 8.4,
+    "genre": "Новый жанр",
+    "director": "Новый режиссер",
+}
+
+
+def stats_row(app, model, stats_model, name):
+    with app.app_context():
+        item_id = db.session.execute(select(model.id).where(model.name == name)).scalar()
+        stats = db.session.get(stats_model, item_id) if item_id is not None else None
+        row = (stats.movie_count, stats.max_rating) if stats is not None else None
+        db.session.remove()
+    return item_id, row
+
+
+def test_post_without_id_is_listed_and_counted(app, client):
+    assert client.post("/movies/", json=NEW_MOVIE).status_code == 201
+
+    movies = client.get("/movies/?sort=year&order=desc&limit=100").json
+    created = [movie for movie in movies if movie["title"] == NEW_MOVIE["title"]]
+    assert len(created) == 1
+    assert {key: created[0][key] for key in NEW_MOVIE} == NEW_MOVIE
+    assert client.get(f"/movies/{created[0]['id']}").status_code == 200
+
+    genre_id, genre_stats = stats_row(app, Genre, GenreStats, "Новый жанр")
+    director_id, director_stats = stats_row(app, Director, DirectorStats, "Новый режиссер")
+    assert genre_stats == (1, 8.4)
+    assert director_stats == (1, 8.4)
+    assert client.get(f"/genres/{genre_id}/stats").json["movie_count"] == 1
+    assert client.get(f"/directors/{director_id}").json[0]["title"] == NEW_MOVIE["title"]
+
+
+def test_post_with_id_then_get(client):
+    assert client.post("/movies/", json=dict(NEW_MOVIE, id=1000)).status_code == 201
+
+    response = client.get("/movies/1000")
+    assert response.status_code == 200
+    assert response.json["genre"] == "Новый жанр"
+
+
+def test_post_directory_without_id_then_movie_by_name(client):
+    assert client.post("/genres/", json={"name": "Жанр без id"}).status_code == 201
+    assert client.post("/directors/", json={"name": "Режиссер без id"}).status_code == 201
+    genre = next(item for item in client.get("/genres/").json if item["name"] == "Жанр без id")
+    director = next(item for item in client.get("/directors/").json if item["name"] == "Режиссер без id")
+
+    movie = dict(NEW_MOVIE, genre="Жанр без id", director="Режиссер без id")
+    assert client.post("/movies/", json=movie).status_code == 201
+
+    assert client.get(f"/genres/{genre['id']}").json[0]["title"] == NEW_MOVIE["title"]
+    assert client.get(f"/directors/{director['id']}/stats").json["movie_count"] == 1
+
+
+def catalogue_version(app):
+    with app.app_context():
+        version = db.session.execute(select(CatalogueVersion.version)).scalar()
+        db.session.remove()
+    return version
+
+
+def test_existing_names_do_not_change_catalogue_version(app, client):
+    version = catalogue_version(app)
+    invalidate_name_index()  # как в другом процессе: имена есть в БД, но не в индексе
+
+    movies = [dict(NEW_MOVIE, genre="Драма", director="Тейлор Шеридан") for _ in range(2)]
+    assert client.post("/movies/batch", json=movies).status_code in (200, 201, 207)
+    assert client.post("/movies/", json=movies[0]).status_code == 201
+    assert catalogue_version(app) == version
+
+    assert client.post("/movies/", json=NEW_MOVIE).status_code == 201
+    assert catalogue_version(app) > version
@@ -1,82 +1,513 @@
-from flask import request
-from sqlalchemy import func
+import base64
+import json
+import re
+import threading
 
-from app.database import db
+from flask import Response, current_app, stream_with_context
+from sqlalchemy import and_, event, or_, select, text, tuple_
+from sqlalchemy.orm import Session
 
-from models import Genre, Director
+from app.database import chunks, db, dialect_insert
+from app.migrations import MOVIE_SEARCH_DOCUMENT
 
-#from app import application
+from app.serialization import MOVIE_FIELDS, dump_movies, dumps_line, movie_load_options, movie_source
+from app.snapshot import bump_catalogue_version, current_catalogue_version
+from models import Genre, Director, Movie
 
 # additional functions
-#with application.app_context():
-def check_and_add_genres():
+
+MOVIE_FILTERS = ("director_id", "genre_id", "year_from", "year_to", "min_rating")
+
+# поля, по которым можно сортировать фильмы
+SORT_FIELDS = ("id", "rating", "year", "title")
+
+# ответы 409 при записи жанра или режиссера (name уникально)
+NAME_CONFLICT = "запись с таким name уже есть"
+ID_OR_NAME_CONFLICT = "запись с таким id или name уже есть"
+
+class NameIndex:
     """
-    проверяет наличие жанра в таблице
-    добавляет новый жанр, если его нет в таблицe
+    индекс "имя -> id" для справочников в памяти процесса, действителен для одной
+    версии справочников (catalogue_version, см. app/snapshot.py), она читается
+    один раз за транзакцию; в общий индекс сразу попадают только имена,
+    прочитанные из зафиксированных строк, а добавленные транзакцией хранятся
+    в session.info и переносятся в индекс после фиксации (after_commit)
     """
-    request_json = request.json
-    all_genres = db.session.query(Genre).all()
-    genre = request_json.get("genre")
 
-    all_genres_response = []
-    for item in all_genres:
-        all_genres_response.append(item.name)
+    def __init__(self):
+        self.names = {Genre: {}, Director: {}}
+        self.version = None
+        self.lock = threading.Lock()
 
-    if genre not in all_genres_response:
-        genre_id = db.session.query(Genre, func.max(Genre.id)).one()
-        new_genre = Genre(
-            id=genre_id[1] + 1,
-            name=genre
-        )
+    def invalidate(self, model=None):
+        """
+        сбрасывает индекс имен для модели (или для всех моделей)
+        """
+        with self.lock:
+            for index_model, index in self.names.items():
+                if model is None or model is index_model:
+                    index.clear()
+
+    def state(self):
+        """
+        состояние индекса в текущей транзакции (при первом обращении сверяет версию)
+        """
+        state = db.session.info.get("name_index")
+        if state is not None:
+            return state
+
+        version = current_catalogue_version()
+        with self.lock:
+            if version != self.version:
+                for index in self.names.values():
+                    index.clear()
+                self.version = version
+        state = db.session.info["name_index"] = {
+            "index": self,
+            "checked": version,  # версия, с которой сверен индекс
+            "version": version,  # версия после записей транзакции (None - неизвестна)
+            "added": {model: {} for model in self.names},
+        }
+        return state
+
+    def lookup(self, model, names):
+        """
+        известные id для имен: добавленные транзакцией и из общего индекса
+        """
+        added = self.state()["added"][model]
+        index = self.names[model]
+        return {name: added.get(name, index.get(name)) for name in names if name in added or name in index}
 
-        db.session.add(new_genre)
-        db.session.commit()
+    def committed(self, model, rows):
+        self.names[model].update(rows)
 
+    def added(self, model, rows):
+        self.state()["added"][model].update(rows)
 
-def check_and_add_directors():
+    def bumped(self):
+        """
+        транзакция увеличила версию справочников: индекс и добавленные имена
+        остаются согласованными, если версия выросла ровно на одну запись
+        """
+        state = self.state()
+        version = current_catalogue_version()
+        state["version"] = version if state["version"] is not None and version == state["version"] + 1 else None
+
+    def publish(self, state):
+        with self.lock:
+            # пока транзакция шла, индекс мог быть сброшен или сверен с другой версией
+            if state["version"] is None or self.version != state["checked"]:
+                return
+            for model, rows in state["added"].items():
+                self.names[model].update(rows)
+            self.version = state["version"]
+
+
+_name_index = NameIndex()
+
+
+def invalidate_name_index(model=None):
     """
-    проверяет наличие режиссера в таблице
-    добавляет нового режиссера, если его нет в таблицу
+    сбрасывает индекс имен для модели (или для всех моделей)
     """
-    request_json = request.json
-    all_genres = db.session.query(Director).all()
-    director = request_json.get("director")
+    _name_index.invalidate(model)
 
-    all_directors_response = []
-    for item in all_genres:
-        all_directors_response.append(item.name)
 
-    if director not in all_directors_response:
-        director_id = db.session.query(Director, func.max(Director.id)).one()
-        new_director = Director(
-            id=director_id[1] + 1,
-            name=director
-        )
+def _invalidate_on_write(mapper, connection, target):
+    invalidate_name_index(type(target))
+
+
+for _model in _name_index.names:
+    event.listen(_model, "after_update", _invalidate_on_write)
+    event.listen(_model, "after_delete", _invalidate_on_write)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_on_commit(session):
+    state = session.info.pop("name_index", None)
+    if state is not None:
+        state["index"].publish(state)
+
+
+@event.listens_for(Session, "after_rollback")
+def _invalidate_on_rollback(session):
+    # id, выданные в откаченной транзакции, больше не существуют
+    state = session.info.pop("name_index", None)
+    if state is not None:
+        state["index"].invalidate()
+
+
+def _add_names(model, names):
+    """
+    добавляет записи в справочник, если их еще нет (INSERT ... ON CONFLICT DO NOTHING);
+    id выдает БД, параллельная вставка того же имени не приводит к ошибке
+    (на СУБД без ON CONFLICT - обычный INSERT)
+    """
+    stmt = dialect_insert(model.__table__)
+    if hasattr(stmt, "on_conflict_do_nothing"):
+        stmt = stmt.on_conflict_do_nothing(index_elements=["name"])
+    result = db.session.execute(stmt, [{"name": name} for name in names])
+    # версия меняется, только если записи добавлены (-1 - драйвер не сообщил число строк)
+    if result.rowcount:
+        bump_catalogue_version()
+        _name_index.bumped()
+
+
+def _select_ids(model, names):
+    found = {}
+    for chunk in chunks(names):
+        found.update(db.session.query(model.name, model.id).filter(model.name.in_(chunk)))
+    return found
+
+
+def resolve_ids(model, names):
+    """
+    возвращает словарь "имя -> id" для набора имен справочника,
+    недостающие записи добавляются в таблицу
+    """
+    names = {name for name in names if name is not None}
+    if not names:
+        return {}
+
+    ids = _name_index.lookup(model, names)
+    missing = list(names - ids.keys())
+    if missing:
+        committed = _select_ids(model, missing)
+        _name_index.committed(model, committed)
+        ids.update(committed)
+        missing = [name for name in missing if name not in committed]
+    if missing:
+        _add_names(model, missing)
+        added = _select_ids(model, missing)
+        _name_index.added(model, added)
+        ids.update(added)
+    return ids
+
+
+def _get_or_add_id(model, name):
+    """
+    возвращает id записи справочника по имени,
+    добавляет запись, если ее нет в таблице
+    """
+    if name is None:
+        return None
+    return resolve_ids(model, [name])[name]
 
-        db.session.add(new_director)
-        db.session.commit()
+
+def name_taken(model, name, item_id=None):
+    """
+    проверяет, занято ли имя другой записью справочника (кроме item_id)
+    """
+    if name is None:
+        return False
+    query = select(model.id).where(model.name == name)
+    if item_id is not None:
+        query = query.where(model.id != item_id)
+    return db.session.execute(query.limit(1)).first() is not None
 
 
 def set_genre_id(genre_name):
     """
-    получает номер последнего id в таблице genre
-    (в таблице нет autoincrement PK)
+    возвращает id жанра по названию,
+    добавляет новый жанр, если его нет в таблице
     """
-    all_genres = db.session.query(Genre).all()
-    for genre in all_genres:
-        if genre_name == genre.name:
-            genre_id = genre.id
-            return genre_id
+    return _get_or_add_id(Genre, genre_name)
 
 
 def set_director_id(director_name):
     """
-    получает номер последнего id в таблице director
-    (в таблице нет autoincrement PK)
+    возвращает id режиссера по имени,
+    добавляет нового режиссера, если его нет в таблице
+    """
+    return _get_or_add_id(Director, director_name)
+
+
+def movie_rows(items):
+    """
+    преобразует список фильмов из запроса в строки таблицы Movie,
+    жанры и режиссеры находятся (или добавляются) по названиям пачкой
+    """
+    genre_ids = resolve_ids(Genre, (item.get("genre") for item in items))
+    director_ids = resolve_ids(Director, (item.get("director") for item in items))
+
+    return [
+        {
+            "id": item.get("id"),
+            "title": item.get("title"),
+            "description": item.get("description"),
+            "trailer": item.get("trailer"),
+            "year": item.get("year"),
+            "rating": item.get("rating"),
+            "genre_id": genre_ids.get(item.get("genre")),
+            "director_id": director_ids.get(item.get("director")),
+        }
+        for item in items
+    ]
+
+
+def _id_list(args, name):
+    """
+    список id из параметра: genre_id=1&genre_id=4 или genre_id=1,4;
+    ValueError - не целое число
+    """
+    ids = []
+    for value in args.getlist(name):
+        for item in value.split(","):
+            if not item.strip():
+                continue
+            try:
+                ids.append(int(item))
+            except ValueError:
+                raise ValueError(f"{name}: ожидаются целые числа через запятую") from None
+    return ids
+
+
+def _number(args, name, type):
+    """
+    число из параметра (None, если его нет); ValueError - не число
+    """
+    value = args.get(name)
+    if value is None:
+        return None
+    try:
+        return type(value)
+    except ValueError:
+        raise ValueError(f"{name}: ожидается число") from None
+
+
+def filter_movies(query, args, source=None):
+    """
+    применяет к запросу фильмов фильтры (их можно комбинировать):
+    director_id, genre_id - один или несколько id,
+    year_from, year_to - диапазон годов, min_rating - минимальный рейтинг;
+    source - модель с колонками фильмов (по умолчанию movie_source());
+    ValueError - недопустимое значение фильтра
+    """
+    source = source or movie_source()
+    director_ids = _id_list(args, "director_id")
+    genre_ids = _id_list(args, "genre_id")
+    year_from = _number(args, "year_from", int)
+    year_to = _number(args, "year_to", int)
+    min_rating = _number(args, "min_rating", float)
+
+    if director_ids:
+        query = query.filter(source.director_id.in_(director_ids))
+    if genre_ids:
+        query = query.filter(source.genre_id.in_(genre_ids))
+    if year_from is not None:
+        query = query.filter(source.year >= year_from)
+    if year_to is not None:
+        query = query.filter(source.year <= year_to)
+    if min_rating is not None:
+        query = query.filter(source.rating >= min_rating)
+    return query
+
+
+def is_filtered(args):
+    """
+    проверяет, передан ли хотя бы один фильтр фильмов
+    """
+    return any(name in args for name in MOVIE_FILTERS)
+
+
+def sort_field(args):
+    """
+    поле сортировки списка фильмов (sort=rating|year|title, по умолчанию id)
+    """
+    return args.get("sort") if args.get("sort") in SORT_FIELDS else "id"
+
+
+def movie_fields(args):
+    """
+    поля ответа из параметра fields=<поле>,<поле> (в порядке MovieSchema)
+    и поля для выборки из БД - к ним добавляются id и поле сортировки для курсора;
+    (None, None) - все поля, ValueError - неизвестное поле
+    """
+    requested = {name.strip() for value in args.getlist("fields") for name in value.split(",") if name.strip()}
+    if not requested:
+        return None, None
+
+    unknown = requested.difference(MOVIE_FIELDS)
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(sorted(unknown))}")
+
+    names = [name for name in MOVIE_FIELDS if name in requested]
+    return names, list(dict.fromkeys(names + ["id", sort_field(args)]))
+
+
+def get_page_size(args):
+    """
+    возвращает размер страницы из параметра limit,
+    ограниченный значением MOVIES_MAX_PAGE_SIZE
+    """
+    limit = args.get("limit", current_app.config["MOVIES_PER_PAGE"], type=int)
+    return max(1, min(limit, current_app.config["MOVIES_MAX_PAGE_SIZE"]))
+
+
+def _encode_cursor(value, movie_id):
+    return base64.urlsafe_b64encode(json.dumps([value, movie_id]).encode()).decode()
+
+
+def _decode_cursor(cursor):
+    if cursor is None:
+        return None
+    try:
+        value, movie_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    # в курсоре только значения колонок: строка, число или null (фильмы без значения) и целый id
+    if value is not None and (not isinstance(value, (str, int, float)) or isinstance(value, bool)):
+        return None
+    if not isinstance(movie_id, int) or isinstance(movie_id, bool):
+        return None
+    return value, movie_id
+
+
+def page_query(query, args, source=None):
+    """
+    добавляет к запросу фильмов сортировку, курсор или смещение и лимит страницы
+    (на одну запись больше), возвращает запрос, поле сортировки и размер страницы;
+    подходит и для Query, и для select()
+
+    sort=rating|year|title, order=asc|desc - сортировка (по умолчанию по id),
+    при сортировке по полю фильмы без значения этого поля выводятся последними (по id);
+    курсор (keyset): after_id=<id> при сортировке по id, cursor=<токен> - при остальных,
+    page - номер страницы (OFFSET), оставлен для совместимости;
+    source - модель с колонками фильмов (по умолчанию movie_source())
+    """
+    source = source or movie_source()
+    limit = get_page_size(args)
+    sort = sort_field(args)
+    column = getattr(source, sort)
+    descending = args.get("order") == "desc"
+
+    if sort == "id":
+        query = query.order_by(source.id.desc() if descending else source.id)
+        position = args.get("after_id", type=int)
+        if position is not None:
+            query = query.filter(source.id < position if descending else source.id > position)
+    else:
+        # keyset по паре (поле, id), чтобы порядок был однозначным; NULL - в конце
+        if descending:
+            query = query.order_by(column.desc().nulls_last(), source.id.desc())
+        else:
+            query = query.order_by(column.asc().nulls_last(), source.id)
+        position = _decode_cursor(args.get("cursor"))
+        if position is not None:
+            value, movie_id = position
+            after_id = source.id < movie_id if descending else source.id > movie_id
+            if value is None:
+                # курсор внутри фильмов без значения поля
+                query = query.filter(column.is_(None), after_id)
+            else:
+                key, bound = tuple_(column, source.id), tuple_(value, movie_id)
+                query = query.filter(or_(key < bound if descending else key > bound, column.is_(None)))
+
+    if position is None:
+        page = max(args.get("page", 1, type=int), 1)
+        query = query.offset((page - 1) * limit)
+
+    # лишняя запись показывает, есть ли следующая страница
+    return query.limit(limit + 1), sort, limit
+
+
+def page_result(movies, sort, limit):
+    """
+    возвращает страницу фильмов (результат page_query) и курсор следующей страницы
+    """
+    next_cursor = None
+    if len(movies) > limit:
+        last = movies[limit - 1]
+        next_cursor = last.id if sort == "id" else _encode_cursor(getattr(last, sort), last.id)
+    return movies[:limit], next_cursor
+
+
+def paginate_movies(query, args):
+    """
+    возвращает страницу фильмов и курсор следующей страницы (параметры - см. page_query)
+    """
+    query, sort, limit = page_query(query, args)
+    return page_result(query.all(), sort, limit)
+
+
+def wants_stream(args):
+    """
+    проверяет, запрошена ли потоковая выдача (stream=ndjson)
+    """
+    return args.get("stream") == "ndjson"
+
+
+def stream_movies(query, names=None):
+    """
+    возвращает ответ, который построчно (NDJSON) отдает все фильмы запроса
+    (поля names), читая их из БД пачками, чтобы не держать весь список в памяти
+    """
+    chunk_size = current_app.config["MOVIES_STREAM_CHUNK_SIZE"]
+
+    def generate():
+        # ответ отдается уже после выхода из view, поэтому транзакция своя
+        with db.session.begin():
+            chunk = []
+            for movie in query.order_by(movie_source().id).yield_per(chunk_size):
+                chunk.append(movie)
+                if len(chunk) == chunk_size:
+                    yield b"".join(dumps_line(item) for item in dump_movies(chunk, names))
+                    chunk = []
+            if chunk:
+                yield b"".join(dumps_line(item) for item in dump_movies(chunk, names))
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+def search_statement(query_text, limit):
+    """
+    запрос id фильмов по словам (и их началам) в названии и описании,
+    упорядоченных по релевантности (название весит больше описания):
+    на SQLite - FTS5 и bm25, на PostgreSQL - GIN-индекс по tsvector и ts_rank;
+    на других СУБД - ILIKE по подстроке без индекса и ранжирования (по id);
+    None, если в строке нет слов
+    """
+    words = re.findall(r"\w+", query_text.lower())
+    if not words:
+        return None
+
+    dialect_name = db.engine.dialect.name
+    if dialect_name == "sqlite":
+        match = " ".join(f'"{word}"*' for word in words)
+        return text(
+            "SELECT rowid FROM movie_fts WHERE movie_fts MATCH :match "
+            "ORDER BY bm25(movie_fts, 10.0, 1.0) LIMIT :limit"
+        ).bindparams(match=match, limit=limit)
+
+    if dialect_name == "postgresql":
+        # слова состоят только из \w, экранировать синтаксис tsquery не нужно
+        match = " & ".join(f"{word}:*" for word in words)
+        return text(
+            f"SELECT id FROM movie WHERE ({MOVIE_SEARCH_DOCUMENT}) @@ to_tsquery('simple', :match) "
+            f"ORDER BY ts_rank({MOVIE_SEARCH_DOCUMENT}, to_tsquery('simple', :match)) DESC, id LIMIT :limit"
+        ).bindparams(match=match, limit=limit)
+
+    conditions = []
+    for word in words:
+        pattern = "%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        conditions.append(
+            or_(Movie.title.ilike(pattern, escape="\\"), Movie.description.ilike(pattern, escape="\\"))
+        )
+    return select(Movie.id).filter(and_(*conditions)).order_by(Movie.id).limit(limit)
+
+
+def search_movies(query_text, limit, names=None):
+    """
+    ищет фильмы по словам (и их началам) в названии и описании,
+    результаты упорядочены по релевантности; names - загружаемые поля
     """
-    all_directors = db.session.query(Director).all()
-    for director in all_directors:
-        if director_name == director.name:
-            director_id = director.id
-            return director_id
+    statement = search_statement(query_text, limit)
+    if statement is None:
+        return []
 
+    movie_ids = db.session.execute(statement).scalars().all()
+    query = db.session.query(Movie).filter(Movie.id.in_(movie_ids))
+    if names is not None:
+        query = query.options(*movie_load_options(names))
+    movies = {movie.id: movie for movie in query}
+    return [movies[movie_id] for movie_id in movie_ids if movie_id in movies]
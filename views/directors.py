@@ -1,17 +1,33 @@
 from flask_restx import Resource, Namespace
 
 from flask import request
+from sqlalchemy.exc import IntegrityError
 
+from app.batch import CREATE, UPSERT, DELETE, run_batch
+from app.cache import response_cache
+from app.coalescing import request_coalescer
 from app.database import db
-
-from models import MovieSchema, Director, Movie, DirectorSchema
-
-directors_ns = Namespace("directors")
+from app.integrity import DirectoryDelete, reassign_movies
+from app.ratelimit import rate_limiter
+from app.read_model import DirectoryChanges
+from app.serialization import movies_query, movie_source, dump_movies, json_response
+from app.snapshot import catalogue_snapshot
+from app.stats import stats_query
+
+from models import Director, DirectorSchema, DirectorStatsSchema
+from utils import (
+    ID_OR_NAME_CONFLICT, NAME_CONFLICT, invalidate_name_index, movie_fields, name_taken, paginate_movies, wants_stream,
+    stream_movies,
+)
+
+directors_ns = Namespace("directors", decorators=[
+    request_coalescer.coalesced("directors"), response_cache.cached, rate_limiter.limited("directors"),
+])
 
 director_schema = DirectorSchema()
 directors_schema = DirectorSchema(many=True)
-
-movies_schema = MovieSchema(many=True)
+director_stats_schema = DirectorStatsSchema()
+directors_stats_schema = DirectorStatsSchema(many=True)
 
 
 @directors_ns.route("/")
@@ -20,6 +36,10 @@ class DirectorsView(Resource):
         """
         возвращает сериализованные данные обо всех режиссерах
         """
+        snapshot_response = catalogue_snapshot.list_response(Director)
+        if snapshot_response is not None:
+            return snapshot_response
+
         with db.session.begin():
             directors = db.session.query(Director).all()
             if not directors:
@@ -33,52 +53,153 @@ class DirectorsView(Resource):
         request_json = request.json
         new_director = Director(**request_json)
 
+        try:
+            with db.session.begin():
+                if name_taken(Director, new_director.name):
+                    return NAME_CONFLICT, 409
+                db.session.add(new_director)
+                db.session.flush()  # без id в запросе его выдает БД при вставке
+                DirectoryChanges(Director).refresh([new_director.id])
+                db.session.commit()  # commit added
+        except IntegrityError:
+            # занят id или то же имя добавлено параллельно
+            return ID_OR_NAME_CONFLICT, 409
+
+        return "", 201
+
+
+@directors_ns.route("/stats")
+class DirectorsStatsView(Resource):
+    def get(self):
+        """
+        возвращает сводки по всем режиссерам: число фильмов, средний и максимальный рейтинг
+        """
         with db.session.begin():
-            db.session.add(new_director)
-            db.session.commit()  # commit added
+            return directors_stats_schema.dump(stats_query(Director).all()), 200
 
 
-        return "", 201
+@directors_ns.route("/<int:did>/stats")
+class DirectorStatsView(Resource):
+    def get(self, did: int):
+        """
+        возвращает сводку по одному режиссеру
+        """
+        with db.session.begin():
+            stats = stats_query(Director).filter(Director.id == did).first()
+            if not stats:
+                return "", 404
+            return director_stats_schema.dump(stats), 200
+
+
+@directors_ns.route("/batch")
+class DirectorsBatchView(Resource):
+    def post(self):
+        """
+        добавляет список режиссеров одной транзакцией
+        """
+        return run_batch(Director, CREATE, after_write=DirectoryChanges(Director).refresh)
+
+    def put(self):
+        """
+        добавляет или обновляет список режиссеров (по id) одной транзакцией
+        """
+        response = run_batch(Director, UPSERT, after_write=DirectoryChanges(Director).refresh)
+        invalidate_name_index(Director)
+        return response
+
+    def delete(self):
+        """
+        удаляет режиссеров по списку id одной транзакцией
+        """
+        deletion = DirectoryDelete(Director)
+        response = run_batch(
+            Director, DELETE, before_write=deletion.before_write, after_write=deletion.after_write, validate=deletion.errors,
+        )
+        invalidate_name_index(Director)
+        return response
 
 
 @directors_ns.route("/<int:did>")
 class DirectorsView(Resource):
     def get(self, did: int):
         """
-        возвращает все фильмы режиссера
+        возвращает фильмы режиссера постранично (как /movies/),
+        stream=ndjson - все фильмы построчно
         """
+        try:
+            names, selected = movie_fields(request.args)
+        except ValueError as error:
+            return str(error), 400
+
         with db.session.begin():
-            director_movies = db.session.query(Movie).filter(Movie.director_id == did)
-            if not director_movies:
-                return "", 404
-            return movies_schema.dump(director_movies), 200
+            director_movies = movies_query(selected).filter(movie_source().director_id == did)
+            if wants_stream(request.args):
+                return stream_movies(director_movies, names)
+
+            movies, next_cursor = paginate_movies(director_movies, request.args)
+            headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+            return json_response(dump_movies(movies, names), 200, headers)
 
     def put(self, did: int):
         """
         обновляет режиссера в таблице Director
         """
-        with db.session.begin():
-            director = db.session.query(Director).get(did)
-            request_json = request.json
+        try:
+            with db.session.begin():
+                director = db.session.query(Director).get(did)
+                request_json = request.json
+                if name_taken(Director, request_json.get("name"), did):
+                    return NAME_CONFLICT, 409
 
-            director.id = request_json.get("id")
-            director.name = request_json.get("name")
-            db.session.add(director)
-            db.session.commit()
+                changes = DirectoryChanges(Director)
+                changes.collect([did])
+
+                director.id = request_json.get("id")
+                director.name = request_json.get("name")
+                db.session.add(director)
+                changes.refresh([director.id])  # название в movie_view
+                db.session.commit()
+        except IntegrityError:
+            return ID_OR_NAME_CONFLICT, 409
 
         return "", 200
 
     def delete(self, did: int):
         """
         удаляет режиссера в таблице Director
+        (фильмы - по DIRECTORY_DELETE_MODE, при restrict - 409, если они есть)
         """
         with db.session.begin():
-            try:
-                director = db.session.query(Director).get(did)
+            director = db.session.query(Director).get(did)
+            if director is None:
+                return " Такой записи в базе нет", 404
 
-                db.session.delete(director)
-                db.session.commit()
-                return "", 204
+            deletion = DirectoryDelete(Director)
+            errors = deletion.errors([did])
+            if errors:
+                return errors[did], 409
+
+            deletion.before_write([did])
+            db.session.delete(director)
+            deletion.after_write()
+            db.session.commit()
+            return "", 204
+
+
+@directors_ns.route("/<int:did>/reassign")
+class DirectorReassignView(Resource):
+    def post(self, did: int):
+        """
+        переносит все фильмы режиссера на другого режиссера ({"to_id": <id>}) одним UPDATE
+        """
+        request_json = request.json
+        to_id = request_json.get("to_id") if isinstance(request_json, dict) else None
+        if not isinstance(to_id, int) or isinstance(to_id, bool):
+            return "Нужен to_id - id режиссера", 400
+
+        with db.session.begin():
+            if db.session.query(Director).filter(Director.id.in_({did, to_id})).count() < len({did, to_id}):
+                return "Такой записи в базе нет", 404
+            moved = reassign_movies(Director, did, to_id)
 
-            except:
-                return f" Такой записи в базе нет", 404
+        return {"from_id": did, "to_id": to_id, "movies": moved}, 200
@@ -1,16 +1,33 @@
 from flask_restx import Resource, Namespace
 
 from flask import request
+from sqlalchemy.exc import IntegrityError
 
+from app.batch import CREATE, UPSERT, DELETE, run_batch
+from app.cache import response_cache
+from app.coalescing import request_coalescer
 from app.database import db
-
-from models import Movie, Genre, MovieSchema, GenreSchema
-
-genres_ns = Namespace("genres")
+from app.integrity import DirectoryDelete, reassign_movies
+from app.ratelimit import rate_limiter
+from app.read_model import DirectoryChanges
+from app.serialization import movies_query, movie_source, dump_movies, json_response
+from app.snapshot import catalogue_snapshot
+from app.stats import stats_query
+
+from models import Genre, GenreSchema, GenreStatsSchema
+from utils import (
+    ID_OR_NAME_CONFLICT, NAME_CONFLICT, invalidate_name_index, movie_fields, name_taken, paginate_movies, wants_stream,
+    stream_movies,
+)
+
+genres_ns = Namespace("genres", decorators=[
+    request_coalescer.coalesced("genres"), response_cache.cached, rate_limiter.limited("genres"),
+])
 
 genre_schema = GenreSchema()
 genres_schema = GenreSchema(many=True)
-movies_schema = MovieSchema(many=True)
+genre_stats_schema = GenreStatsSchema()
+genres_stats_schema = GenreStatsSchema(many=True)
 
 
 
@@ -20,6 +37,10 @@ class GenresView(Resource):
         """
         возвращает все жанры
         """
+        snapshot_response = catalogue_snapshot.list_response(Genre)
+        if snapshot_response is not None:
+            return snapshot_response
+
         with db.session.begin():
             genres = db.session.query(Genre).all()
             if not genres:
@@ -33,49 +54,153 @@ class GenresView(Resource):
         request_json = request.json
         new_genre = Genre(**request_json)
 
-        with db.session.begin():
-            db.session.add(new_genre)
-            db.session.commit()  # commit added
+        try:
+            with db.session.begin():
+                if name_taken(Genre, new_genre.name):
+                    return NAME_CONFLICT, 409
+                db.session.add(new_genre)
+                db.session.flush()  # без id в запросе его выдает БД при вставке
+                DirectoryChanges(Genre).refresh([new_genre.id])
+                db.session.commit()  # commit added
+        except IntegrityError:
+            # занят id или то же имя добавлено параллельно
+            return ID_OR_NAME_CONFLICT, 409
 
         return "", 201
 
 
+@genres_ns.route("/stats")
+class GenresStatsView(Resource):
+    def get(self):
+        """
+        возвращает сводки по всем жанрам: число фильмов, средний и максимальный рейтинг
+        """
+        with db.session.begin():
+            return genres_stats_schema.dump(stats_query(Genre).all()), 200
+
+
+@genres_ns.route("/<int:gid>/stats")
+class GenreStatsView(Resource):
+    def get(self, gid: int):
+        """
+        возвращает сводку по одному жанру
+        """
+        with db.session.begin():
+            stats = stats_query(Genre).filter(Genre.id == gid).first()
+            if not stats:
+                return "", 404
+            return genre_stats_schema.dump(stats), 200
+
+
+@genres_ns.route("/batch")
+class GenresBatchView(Resource):
+    def post(self):
+        """
+        добавляет список жанров одной транзакцией
+        """
+        return run_batch(Genre, CREATE, after_write=DirectoryChanges(Genre).refresh)
+
+    def put(self):
+        """
+        добавляет или обновляет список жанров (по id) одной транзакцией
+        """
+        response = run_batch(Genre, UPSERT, after_write=DirectoryChanges(Genre).refresh)
+        invalidate_name_index(Genre)
+        return response
+
+    def delete(self):
+        """
+        удаляет жанры по списку id одной транзакцией
+        """
+        deletion = DirectoryDelete(Genre)
+        response = run_batch(
+            Genre, DELETE, before_write=deletion.before_write, after_write=deletion.after_write, validate=deletion.errors,
+        )
+        invalidate_name_index(Genre)
+        return response
+
+
 @genres_ns.route("/<int:gid>")
 class GenresView(Resource):
     def get(self, gid: int):
         """
-        возвращает все фильмы жанра
+        возвращает фильмы жанра постранично (как /movies/),
+        stream=ndjson - все фильмы построчно
         """
+        try:
+            names, selected = movie_fields(request.args)
+        except ValueError as error:
+            return str(error), 400
+
         with db.session.begin():
-            all_movies_by_genre = db.session.query(Movie).filter(Movie.genre_id == gid)
-            return movies_schema.dump(all_movies_by_genre)
+            all_movies_by_genre = movies_query(selected).filter(movie_source().genre_id == gid)
+            if wants_stream(request.args):
+                return stream_movies(all_movies_by_genre, names)
+
+            movies, next_cursor = paginate_movies(all_movies_by_genre, request.args)
+            headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+            return json_response(dump_movies(movies, names), 200, headers)
 
     def put(self, gid: int):
         """
         обновляет жанр в таблице Genre
         """
-        with db.session.begin():
-            genre = db.session.query(Genre).get(gid)
-            request_json = request.json
+        try:
+            with db.session.begin():
+                genre = db.session.query(Genre).get(gid)
+                request_json = request.json
+                if name_taken(Genre, request_json.get("name"), gid):
+                    return NAME_CONFLICT, 409
 
-            genre.id = request_json.get("id")
-            genre.name = request_json.get("name")
-            db.session.add(genre)
-            db.session.commit()
+                changes = DirectoryChanges(Genre)
+                changes.collect([gid])
 
-            return "", 200
+                genre.id = request_json.get("id")
+                genre.name = request_json.get("name")
+                db.session.add(genre)
+                changes.refresh([genre.id])  # название в movie_view
+                db.session.commit()
+        except IntegrityError:
+            return ID_OR_NAME_CONFLICT, 409
+
+        return "", 200
 
     def delete(self, gid: int):
         """
         удаляет жанр в таблице Genre
+        (фильмы - по DIRECTORY_DELETE_MODE, при restrict - 409, если они есть)
         """
         with db.session.begin():
-            try:
-                genre = db.session.query(Genre).get(gid)
+            genre = db.session.query(Genre).get(gid)
+            if genre is None:
+                return "Такой записи в базе нет", 404
+
+            deletion = DirectoryDelete(Genre)
+            errors = deletion.errors([gid])
+            if errors:
+                return errors[gid], 409
+
+            deletion.before_write([gid])
+            db.session.delete(genre)
+            deletion.after_write()
+            db.session.commit()
+            return "", 204
 
-                db.session.delete(genre)
-                db.session.commit()
-                return "", 204
 
-            except:
+@genres_ns.route("/<int:gid>/reassign")
+class GenreReassignView(Resource):
+    def post(self, gid: int):
+        """
+        переносит все фильмы жанра на другой жанр ({"to_id": <id>}) одним UPDATE
+        """
+        request_json = request.json
+        to_id = request_json.get("to_id") if isinstance(request_json, dict) else None
+        if not isinstance(to_id, int) or isinstance(to_id, bool):
+            return "Нужен to_id - id жанра", 400
+
+        with db.session.begin():
+            if db.session.query(Genre).filter(Genre.id.in_({gid, to_id})).count() < len({gid, to_id}):
                 return "Такой записи в базе нет", 404
+            moved = reassign_movies(Genre, gid, to_id)
+
+        return {"from_id": gid, "to_id": to_id, "movies": moved}, 200
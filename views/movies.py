@@ -2,49 +2,57 @@ from flask_restx import Resource, Namespace
 
 from flask import request
 
+from app.batch import CREATE, UPSERT, DELETE, run_batch
+from app.cache import response_cache
+from app.coalescing import request_coalescer
 from app.database import db
+from app.export import EXPORT_FORMATS, export_movies, parse_updated_since
+from app.ratelimit import rate_limiter
+from app.serialization import movies_query, movie_source, dump_movies, json_response, projected_schema
+from app.stats import AffectedGroups
 
-from models import Movie, MovieSchema
-from utils import check_and_add_genres, check_and_add_directors, set_genre_id, set_director_id
+from models import Movie
+from utils import (
+    set_genre_id, set_director_id, movie_rows, filter_movies, is_filtered, get_page_size, movie_fields,
+    paginate_movies, wants_stream, stream_movies, search_movies,
+)
 
-movies_ns = Namespace("movies")
-
-movie_schema = MovieSchema()
-movies_schema = MovieSchema(many=True)
+movies_ns = Namespace("movies", decorators=[
+    request_coalescer.coalesced("movies"), response_cache.cached, rate_limiter.limited("movies"),
+])
 
 @movies_ns.route("/")
 class MoviesView(Resource):
     def get(self):
         """
         возвращает сериализованные данные о фильмах
+        фильтры (можно комбинировать): director_id, genre_id (несколько через запятую),
+        year_from, year_to, min_rating;
+        сортировка: sort=rating|year|title, order=asc|desc;
+        постранично: page=N или курсор (after_id=<id> / cursor=<токен> при sort),
+        limit=<размер страницы>; курсор следующей страницы - в заголовке X-Next-Cursor;
+        stream=ndjson - все фильмы построчно, без пагинации;
+        fields=<поле>,<поле> - только эти поля (выбираются из БД только они)
         """
-        with db.session.begin():
-            director_id = request.args.get("director_id")
-            genre_id = request.args.get("genre_id")
-
-            page = int(request.args.get("page", 1))
-            movies_per_page = 5
+        try:
+            names, selected = movie_fields(request.args)
+        except ValueError as error:
+            return str(error), 400
 
-            pagination_from = (page - 1) * movies_per_page
-            pagination_to = page * movies_per_page
-
-            if director_id:
-                movies_by_director = db.session.query(Movie).filter(Movie.director_id == director_id)
-                if len(movies_schema.dump(movies_by_director)) > 0:
-                    return movies_schema.dump(movies_by_director), 200
-                else:
-                    return "", 204
+        with db.session.begin():
+            try:
+                filtered_movies = filter_movies(movies_query(selected), request.args)
+            except ValueError as error:
+                return str(error), 400
+            if wants_stream(request.args):
+                return stream_movies(filtered_movies, names)
 
-            if genre_id:
-                movies_by_genre = db.session.query(Movie).filter(Movie.genre_id == genre_id)
-                if len(movies_schema.dump(movies_by_genre)) > 0:
-                    return movies_schema.dump(movies_by_genre), 200
-                else:
-                    return "", 204
+            movies, next_cursor = paginate_movies(filtered_movies, request.args)
+            headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
 
-            else:
-                paginated_movies = Movie.query.order_by(Movie.id)[pagination_from:pagination_to]
-                return movies_schema.dump(paginated_movies), 200
+            if is_filtered(request.args) and not movies:
+                return "", 204
+            return json_response(dump_movies(movies, names), 200, headers)
 
     def post(self):
         """
@@ -54,9 +62,6 @@ class MoviesView(Resource):
 
             request_json = request.json
 
-            check_and_add_genres()
-            check_and_add_directors()
-
             new_movie = Movie(
                 id=request_json.get("id"),
                 title=request_json.get("title"),
@@ -68,30 +73,101 @@ class MoviesView(Resource):
                 director_id=set_director_id(request_json.get("director"))
             )
             db.session.add(new_movie)
-            db.session.commit()
+            db.session.flush()  # без id в запросе его выдает БД при вставке
+            AffectedGroups().refresh([new_movie.id])
 
             return "", 201
 
 
+@movies_ns.route("/batch")
+class MoviesBatchView(Resource):
+    def post(self):
+        """
+        добавляет список фильмов одной транзакцией
+        (жанры и режиссеры указываются названиями, как в POST /movies/)
+        """
+        groups = AffectedGroups()
+        return run_batch(Movie, CREATE, movie_rows, groups.collect, groups.refresh)
+
+    def put(self):
+        """
+        добавляет или обновляет список фильмов (по id) одной транзакцией
+        """
+        groups = AffectedGroups()
+        return run_batch(Movie, UPSERT, movie_rows, groups.collect, groups.refresh)
+
+    def delete(self):
+        """
+        удаляет фильмы по списку id одной транзакцией
+        """
+        groups = AffectedGroups()
+        return run_batch(Movie, DELETE, before_write=groups.collect, after_write=groups.refresh)
+
+
+@movies_ns.route("/export")
+class MoviesExportView(Resource):
+    def get(self):
+        """
+        выгружает все фильмы потоком: format=ndjson|csv,
+        updated_since=<дата ISO 8601> - только измененные с этого момента;
+        сжимается gzip, если клиент его принимает
+        """
+        file_format = request.args.get("format", "ndjson")
+        if file_format not in EXPORT_FORMATS:
+            return f"Неизвестный формат: {file_format}", 400
+        try:
+            updated_since = parse_updated_since(request.args.get("updated_since"))
+        except ValueError:
+            return "updated_since: ожидается дата в формате ISO 8601", 400
+
+        compress = "gzip" in request.accept_encodings
+        return export_movies(file_format, updated_since, compress)
+
+
+@movies_ns.route("/search")
+class MoviesSearchView(Resource):
+    def get(self):
+        """
+        полнотекстовый поиск фильмов по названию и описанию:
+        q=<слова>, limit=<число результатов>, fields=<поле>,<поле>
+        """
+        query_text = request.args.get("q", "")
+        if not query_text.strip():
+            return "Нужен параметр q", 400
+        try:
+            names, selected = movie_fields(request.args)
+        except ValueError as error:
+            return str(error), 400
+
+        with db.session.begin():
+            movies = search_movies(query_text, get_page_size(request.args), selected)
+            return projected_schema(names).dump(movies), 200
+
+
 @movies_ns.route("/<int:mid>")
 class MoviesView(Resource):
     def get(self, mid: int):
         """
-        возвращает сериализованные данные об одном фильме
+        возвращает сериализованные данные об одном фильме (fields - как в списке)
         """
+        try:
+            names, selected = movie_fields(request.args)
+        except ValueError as error:
+            return str(error), 400
+
         with db.session.begin():
-            movie = db.session.query(Movie).get(mid)
-            if not movie:
+            movies = movies_query(selected).filter(movie_source().id == mid).all()
+            if not movies:
                 return "", 404
-            return movie_schema.dump(movie), 200
+            return json_response(dump_movies(movies, names)[0], 200)
 
     def put(self, mid: int):
         with db.session.begin():
             movie = db.session.query(Movie).get(mid)
             request_json = request.json
 
-            check_and_add_genres()
-            check_and_add_directors()
+            groups = AffectedGroups()
+            groups.collect([mid])
 
             movie.id = request_json.get("id")
             movie.title = request_json.get("title")
@@ -103,7 +179,7 @@ class MoviesView(Resource):
             movie.director_id = set_director_id(request_json.get("director"))
 
             db.session.add(movie)
-            db.session.commit()
+            groups.refresh([movie.id])
 
             return "", 200
 
@@ -111,8 +187,10 @@ class MoviesView(Resource):
         with db.session.begin():
             try:
                 movie = db.session.query(Movie).get(mid)
+                groups = AffectedGroups()
+                groups.collect([mid])
                 db.session.delete(movie)
-                db.session.commit()
+                groups.refresh()
             except:
                 return f" Такой записи в базе нет", 404
 
@@ -0,0 +1,7 @@
+"""
+точка входа для WSGI-сервера (например, gunicorn wsgi:app),
+профиль конфига берется из APP_ENV (по умолчанию production); схему и данные БД приложение при старте не трогает
+"""
+from main import create_app
+
+app = create_app()